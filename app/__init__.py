@@ -15,6 +15,7 @@ from .api.auth import auth_bp
 from rec.api.rec_api_stub import rec_bp  # 新增导入
 from app.api.dish import dish_bp  # 新增导入
 from .api.feedback import feedback_bp
+from .warmup import start_warmup
 import os
 
 
@@ -52,4 +53,8 @@ def create_app():   # 应用工厂函数，返回配置完成的 Flask 应用实
     api.add_namespace(auth_bp, path='/api/v1/auth')
     api.add_namespace(feedback_bp, path='/api/v1/feedback')
 
+    if app.config['REC_WARMUP']:
+        start_warmup(app)
+    # 可选预热：后台加载模型与索引、建立连接，完成前 /hello/ready 返回 503
+
     return app  # 返回配置完成的应用实例，供 run.py 或 WSGI 服务器使用
\ No newline at end of file
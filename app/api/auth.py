@@ -1,18 +1,11 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from flask import current_app
-from py2neo import Graph
+from app.extensions import neo4j_client
 import hashlib
-import os
 
 auth_bp = Namespace("auth", description="用户认证服务")
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_AUTH = (
-    os.getenv("NEO4J_USER", "neo4j"),
-    os.getenv("NEO4J_PASSWORD", "wwj@51816888")
-)
-
 login_request = auth_bp.model('LoginRequest', {
     'username': fields.String(required=True, description='用户名'),
     'password': fields.String(required=True, description='密码')
@@ -33,18 +26,15 @@ user_response = auth_bp.model('UserResponse', {
 
 
 def get_user_by_username(username):
-    graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
     query = """
     MATCH (u:User {username: $username})
     RETURN u.user_id as user_id, u.username as username, u.password_hash as password_hash
     """
-    result = graph.run(query, username=username).data()
+    result = neo4j_client.run(query, username=username).data()
     return result[0] if result else None
 
 
 def create_user(username, password):
-    graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
-
     existing = get_user_by_username(username)
     if existing:
         return None, "用户名已存在"
@@ -52,7 +42,7 @@ def create_user(username, password):
     password_hash = hashlib.md5(password.encode()).hexdigest()
 
     max_id_query = "MATCH (u:User) RETURN coalesce(max(u.user_id), -1) as max_id"
-    max_result = graph.run(max_id_query).data()
+    max_result = neo4j_client.run(max_id_query).data()
     new_user_id = max_result[0]['max_id'] + 1
 
     if new_user_id >= 500:
@@ -67,7 +57,7 @@ def create_user(username, password):
     })
     RETURN u.user_id as user_id, u.username as username
     """
-    result = graph.run(query, user_id=new_user_id, username=username, password_hash=password_hash).data()
+    result = neo4j_client.run(query, user_id=new_user_id, username=username, password_hash=password_hash).data()
 
     return result[0], "注册成功"
 
@@ -139,13 +129,12 @@ class Profile(Resource):
         except (ValueError, TypeError):
             auth_bp.abort(422, f"无效的 user_id: {user_id_raw}")
 
-        graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
         query = """
         MATCH (u:User) WHERE u.user_id = $user_id
         OPTIONAL MATCH (u)-[:INTERACTED]->(d:Dish)
         RETURN u.user_id as user_id, u.username as username, count(d) as history_count
         """
-        result = graph.run(query, user_id=user_id).data()
+        result = neo4j_client.run(query, user_id=user_id).data()
 
         if not result:
             auth_bp.abort(404, "用户不存在")
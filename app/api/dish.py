@@ -1,21 +1,16 @@
 from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from py2neo import Graph
 import os
 import pickle
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from rec.algo.path_sampler import PathSampler
+from rec.algo.dish_catalog import get_catalog
+from rec.api.rec_api_stub import make_path_sampler
+from app.extensions import redis_client, neo4j_client
 
 dish_bp = Namespace("dish", description="菜品详情")
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_AUTH = (
-    os.getenv("NEO4J_USER", "neo4j"),
-    os.getenv("NEO4J_PASSWORD", "wwj@51816888")
-)
-
 try:
     node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
     cont_to_neo = {int(v): int(k) for k, v in node_map.items()}
@@ -24,6 +19,33 @@ except Exception as e:
     cont_to_neo = {}
 
 
+def get_dish_from_catalog(neo_id):
+    """从共享菜品目录快照读取静态属性"""
+    catalog = get_catalog(redis_client, neo4j_client)
+    idx = catalog.index_of_neo(neo_id)
+    return catalog.info(idx) if idx is not None else None
+
+
+def get_dish_from_graph(neo_id):
+    """快照中不存在（如目录来自 menu.json）时回退到 Neo4j 查询"""
+    query = """
+    MATCH (d:Dish)
+    WHERE id(d) = $neo_id
+    OPTIONAL MATCH (d)-[:HAS_TAG]->(t:Tag)
+    OPTIONAL MATCH (d)-[:CONTAINS]->(i:Ingredient)
+    RETURN d.name as name, 
+           d.price as price, 
+           d.file as photo,
+           collect(DISTINCT t.name) as tags,
+           collect(DISTINCT i.name) as ingredients
+    """
+    result = neo4j_client.run(query, neo_id=int(neo_id)).data()
+
+    if not result or not result[0].get('name'):
+        return None
+    return result[0]
+
+
 @dish_bp.route("/<int:dish_id>")
 class DishDetail(Resource):
     @jwt_required()
@@ -38,28 +60,16 @@ class DishDetail(Resource):
         if not neo_id:
             return {"msg": f"找不到 dish_id {dish_id} 对应的图谱节点"}, 404
 
-        graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
-
-        query = """
-        MATCH (d:Dish)
-        WHERE id(d) = $neo_id
-        OPTIONAL MATCH (d)-[:HAS_TAG]->(t:Tag)
-        OPTIONAL MATCH (d)-[:CONTAINS]->(i:Ingredient)
-        RETURN d.name as name, 
-               d.price as price, 
-               d.file as photo,
-               collect(DISTINCT t.name) as tags,
-               collect(DISTINCT i.name) as ingredients
-        """
-        result = graph.run(query, neo_id=int(neo_id)).data()
-
-        if not result or not result[0].get('name'):
-            return {"msg": "菜品未找到"}, 404
+        data = get_dish_from_catalog(neo_id)
+        if data is None:
+            data = get_dish_from_graph(neo_id)
 
-        data = result[0]
+        if data is None:
+            return {"msg": "菜品未找到"}, 404
 
-        sampler = PathSampler()
-        paths = sampler.sample_paths_for_user_item(user_id, data['name'])
+        # 与推荐接口共用同一套采样器配置（内存图谱 / 共享属性索引 / 路径缓存）
+        sampler = make_path_sampler()
+        paths = sampler.sample_paths_for_user_items(user_id, [data['name']])[data['name']]
 
         if paths:
             patterns = [sampler.get_path_pattern(p) for p in paths]
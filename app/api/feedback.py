@@ -1,5 +1,6 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import current_app
 from datetime import datetime
 import json
 import os
@@ -48,4 +49,12 @@ class Feedback(Resource):
         with open(log_file, 'a', encoding='utf-8') as f:
             f.write(json.dumps(record, ensure_ascii=False) + '\n')
 
+        # 新反馈使该用户的推荐缓存失效（见 rec/api/rec_cache.py）
+        try:
+            from app.extensions import redis_client
+            from rec.api.rec_cache import bump_user_version
+            bump_user_version(redis_client, user_id)
+        except Exception as e:
+            current_app.logger.warning(f"推荐缓存失效通知失败: {e}")
+
         return {'msg': '反馈已记录', 'group': group}
\ No newline at end of file
@@ -6,6 +6,7 @@
 # =============================================================================
 
 from flask_restx import Namespace, Resource
+from app.warmup import get_status
 # Namespace: 命名空间，用于组织相关 API 端点（对应 Swagger 的 tag）
 # Resource: 资源类基类，每个类对应一个 REST 资源，自动映射 HTTP 方法
 
@@ -30,4 +31,15 @@ class Hello(Resource):  # 继承 Resource 类，Flask-RESTX 自动处理请求
     #
     # 功能：最简单的健康检查，确认服务存活
     # 访问：curl http://localhost:5000/hello/
-    # 响应：{"msg": "hello campus food kg rec 🍔
\ No newline at end of file
+    # 响应：{"msg": "hello campus food kg rec 🍔
+
+
+@hello_bp.route("/ready")
+class Ready(Resource):
+    def get(self):
+        status = get_status()
+        return status, (200 if status['ready'] else 503)
+    # 就绪探针：开启 REC_WARMUP 时，预热完成前（含失败重试期间）返回 503，负载均衡据此暂不转发流量
+    # 重试用尽后 state 为 degraded 并返回 200（请求时懒加载恢复），error 字段为最近一次失败原因
+    # 访问：curl http://localhost:5000/hello/ready
+    # 响应：{"ready": true, "state": "ready", "attempts": 1, ...}
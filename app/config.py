@@ -18,4 +18,8 @@ class Config:   # 配置类，使用类变量存储配置项（Flask 标准做
     NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687") # Neo4j 数据库连接地址，Bolt 协议默认端口 7687
     NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "wwj@51816888")
-    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")  # Redis 连接地址，默认本地 6379 端口，数据库 0，用于缓存推荐结果（15min TTL，见任务书 week7-8）
\ No newline at end of file
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")  # Redis 连接地址，默认本地 6379 端口，数据库 0，用于缓存推荐结果（15min TTL，见任务书 week7-8）
+    REC_WARMUP = os.getenv("REC_WARMUP", "0") == "1"    # 启动时后台预热推荐服务，完成前 /hello/ready 返回 503
+    REC_WARMUP_PREFILL = os.getenv("REC_WARMUP_PREFILL", "0") == "1"   # 预热时为 A/B 实验中的活跃用户预填推荐缓存
+    REC_WARMUP_TOPK = int(os.getenv("REC_WARMUP_TOPK", "10"))
+    REC_WARMUP_RETRIES = int(os.getenv("REC_WARMUP_RETRIES", "5"))  # 预热失败的重试次数（指数退避），用尽后以降级状态就绪
@@ -7,6 +7,9 @@
 
 from flask_jwt_extended import JWTManager   # JWT 扩展：处理令牌生成、验证、刷新
 from redis import Redis # Redis 客户端库，用于缓存和会话存储
+from py2neo import Graph    # Neo4j 客户端，Graph 内部自带 Bolt 连接池
+import threading
+import atexit
 import os
 
 jwt = JWTManager()
@@ -16,3 +19,68 @@ jwt = JWTManager()
 
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 redis_client = Redis.from_url(redis_url, decode_responses=True)
+# 二进制客户端：推荐缓存以紧凑二进制格式存储（见 rec/api/rec_codec.py），不能按字符串解码
+redis_binary_client = Redis.from_url(redis_url)
+
+
+
+class Neo4jClient:
+    """
+    进程内共享的 Neo4j 客户端（替代各模块每次调用都新建 Graph）
+    - 懒加载：首次查询时才建立连接池
+    - 按进程隔离：gunicorn fork 出的 worker 检测到 pid 变化后各自重建连接池
+    - 获取超时：并发查询数超过连接池大小时最多等待 acquire_timeout 秒，超时抛 TimeoutError
+    用法与 Graph 相同：neo4j_client.run(query, **params).data()
+    """
+
+    def __init__(self, uri, auth, max_size=10, acquire_timeout=5.0, max_age=3600):
+        self.uri = uri
+        self.auth = auth
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_age = max_age
+        self._graph = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    @property
+    def graph(self):
+        pid = os.getpid()
+        if self._graph is None or self._pid != pid:
+            with self._lock:
+                if self._graph is None or self._pid != pid:
+                    self._graph = Graph(self.uri, auth=self.auth, max_size=self.max_size, max_age=self.max_age)
+                    self._slots = threading.BoundedSemaphore(self.max_size)
+                    self._pid = pid
+        return self._graph
+
+    def run(self, cypher, parameters=None, **kwparameters):
+        graph = self.graph
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"Neo4j 连接池已满（{self.max_size}），{self.acquire_timeout}s 内未获取到连接")
+        try:
+            return graph.run(cypher, parameters, **kwparameters)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._graph is not None and self._pid == os.getpid():
+                try:
+                    self._graph.service.connector.close()
+                except Exception:
+                    pass
+            self._graph = None
+            self._pid = None
+
+
+neo4j_client = Neo4jClient(
+    os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+    (os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "wwj@51816888")),
+    max_size=int(os.getenv("NEO4J_POOL_SIZE", "10")),
+    acquire_timeout=float(os.getenv("NEO4J_ACQUIRE_TIMEOUT", "5")),
+    max_age=int(os.getenv("NEO4J_CONNECTION_MAX_AGE", "3600"))
+)
+# 与 redis_client 一样在模块级创建，各 API 模块直接导入使用
+atexit.register(neo4j_client.close)
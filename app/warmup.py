@@ -0,0 +1,62 @@
+# =============================================================================
+# 功能：推荐服务启动预热与就绪状态
+# 优化：create_app 时在后台线程预加载模型/菜品映射/索引并建立连接，
+#       负载均衡按 /hello/ready 判断，冷 worker 不接真实流量
+# 失败：按指数退避重试 REC_WARMUP_RETRIES 次；仍失败则以 degraded 状态标记就绪并记录错误
+#       （Neo4j/Redis 短暂不可用时请求仍会按需懒加载恢复，不让 worker 永久处于未就绪）
+# 归属：服务层性能优化（冷启动）
+# 上游：app/config.py（REC_WARMUP 等开关）、rec/api/rec_api_stub.py（warm_up）
+# 下游：app/__init__.py（start_warmup）、app/api/hello.py（就绪探针）
+# =============================================================================
+
+import threading
+import time
+
+# 未开启预热时视为就绪（请求仍按需懒加载）
+_status = {'ready': True, 'state': 'disabled', 'error': None, 'attempts': 0,
+           'started_at': None, 'finished_at': None}
+_thread = None
+RETRY_BASE_SECONDS = 2    # 第 n 次失败后等待 2^(n-1) * RETRY_BASE_SECONDS 秒
+RETRY_MAX_SECONDS = 60
+
+
+def get_status():
+    return dict(_status)
+
+
+def is_ready():
+    return _status['ready']
+
+
+def _run(app):
+    retries = app.config.get('REC_WARMUP_RETRIES', 5)
+    with app.app_context():
+        for attempt in range(1, retries + 2):
+            _status['attempts'] = attempt
+            try:
+                from rec.api.rec_api_stub import warm_up, get_user_group_map
+                prefill = list(get_user_group_map()) if app.config.get('REC_WARMUP_PREFILL') else []
+                warm_up(prefill, app.config.get('REC_WARMUP_TOPK', 10))
+                _status.update(ready=True, state='ready', error=None)
+                break
+            except Exception as e:
+                _status['error'] = str(e)
+                if attempt > retries:
+                    # 不再重试：标记就绪接流量，未加载的部分由请求时懒加载重试
+                    _status.update(ready=True, state='degraded')
+                    app.logger.error(f"推荐服务预热失败 {attempt} 次，以降级状态就绪: {e}")
+                    break
+                delay = min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+                app.logger.warning(f"推荐服务预热失败（第 {attempt} 次），{delay}s 后重试: {e}")
+                time.sleep(delay)
+        _status['finished_at'] = time.time()
+
+
+def start_warmup(app):
+    """后台预热；完成前 is_ready() 为 False"""
+    global _thread
+    if _thread is not None:
+        return
+    _status.update(ready=False, state='warming', error=None, attempts=0, started_at=time.time(), finished_at=None)
+    _thread = threading.Thread(target=_run, args=(app,), name='rec-warmup', daemon=True)
+    _thread.start()
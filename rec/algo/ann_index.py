@@ -0,0 +1,142 @@
+# =============================================================================
+# 功能：TransE 候选召回的近似最近邻索引（IVF 倒排 + 精确重排），纯 NumPy 实现
+# 优化：物品按 k-means 聚为 n_lists 个簇，查询只扫描距离最近的 n_probe 个簇，
+#       扫描量约为全量的 n_probe / n_lists；n_probe 越大召回越高、耗时越长
+#       n_probe 默认按召回率目标在样本查询上自动选取；物品数低于 ANN_MIN_ITEMS 时不建索引（精确扫描更快）
+# 归属：服务层性能优化（候选召回，面向多校区菜品规模增长）
+# 上游：rec/api/rec_api_stub.py（ModelState 的物品嵌入矩阵）
+# 下游：rec/api/rec_api_stub.py（build_topk_table 构建 Top-N 排序表、score_topk）、scripts/bench_ann.py
+# =============================================================================
+
+import numpy as np
+import os
+
+ANN_ENABLED = os.getenv("ANN_INDEX", "0") == "1"
+ANN_N_LISTS = int(os.getenv("ANN_N_LISTS", "0"))     # 0 表示按 4·sqrt(n_items) 自动选取
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", "0"))     # 0 表示按 ANN_RECALL_TARGET 自动选取
+ANN_RECALL_TARGET = float(os.getenv("ANN_RECALL_TARGET", "0.95"))
+ANN_MIN_ITEMS = int(os.getenv("ANN_MIN_ITEMS", "50000"))  # 物品数低于该值时全量扫描已足够快，不建索引
+ANN_TUNE_QUERIES = 200    # 选取 n_probe 时用于比对精确结果的样本查询数
+KMEANS_ITERS = 20
+
+
+def ann_applicable(n_items):
+    """开启 ANN_INDEX 且物品规模达到 ANN_MIN_ITEMS 时才建索引"""
+    return ANN_ENABLED and n_items >= ANN_MIN_ITEMS
+
+
+def _sq_dist_rank(x, x_sq_norm, q):
+    """排序用的 2q·x - ||x||²（与 -||q - x||² 同序）"""
+    rank = x @ q
+    rank *= 2
+    rank -= x_sq_norm
+    return rank
+
+
+def kmeans(x, n_clusters, iters=KMEANS_ITERS, seed=0):
+    """Lloyd k-means，返回 (簇中心, 每个样本所属簇)；空簇用离中心最远的样本重新初始化"""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    x_sq = np.einsum('ij,ij->i', x, x)
+    assign = np.zeros(len(x), dtype=np.int64)
+    for _ in range(iters):
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        dist = x_sq[:, None] - 2 * (x @ centroids.T) + c_sq[None, :]
+        assign = np.argmin(dist, axis=1)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            far = np.argsort(-dist[np.arange(len(x)), assign])[:int(empty.sum())]
+            centroids[empty] = x[far]
+    return centroids.astype(x.dtype), assign
+
+
+class IVFIndex:
+    """
+    倒排文件索引：第 l 个簇的物品为 list_items[list_offsets[l]:list_offsets[l+1]]，
+    对应向量按簇连续存放在 list_vectors 中，扫描时顺序读
+    search 输出与 rec_api_stub.score_topk 相同：按分数 -||q - item|| 降序的 (物品偏移, 分数)
+    """
+
+    def __init__(self, item_emb, n_lists=ANN_N_LISTS, n_probe=ANN_N_PROBE, seed=0):
+        item_emb = np.asarray(item_emb, dtype=np.float32)
+        n_items = len(item_emb)
+        if n_lists <= 0:
+            n_lists = int(4 * np.sqrt(n_items))
+        n_lists = max(1, min(n_lists, n_items))
+        self.n_probe = n_probe or 1  # 0（自动）时由 tune_n_probe 设定
+        self.recall = None           # 最近一次 tune_n_probe / measure_recall 测得的召回率
+
+        self.centroids, assign = kmeans(item_emb, n_lists, seed=seed)
+        self.centroid_sq_norm = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        order = np.argsort(assign, kind='stable')
+        self.list_items = order.astype(np.int64)
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=self.list_offsets[1:])
+        self.list_vectors = np.ascontiguousarray(item_emb[order])
+        self.list_sq_norm = np.einsum('ij,ij->i', self.list_vectors, self.list_vectors)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def _probe_ranges(self, q, k, n_probe):
+        """按簇中心距离由近到远取簇，至少 n_probe 个且候选数不少于 k"""
+        order = np.argsort(-_sq_dist_rank(self.centroids, self.centroid_sq_norm, q))
+        sizes = np.diff(self.list_offsets)[order]
+        needed = max(n_probe, int(np.searchsorted(np.cumsum(sizes), k)) + 1)
+        return order[:needed]
+
+    def search(self, q, k, n_probe=None):
+        n_probe = n_probe or self.n_probe
+        q = np.asarray(q, dtype=np.float32)
+        lists = self._probe_ranges(q, k, n_probe)
+        rows = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists])
+
+        rank = _sq_dist_rank(self.list_vectors[rows], self.list_sq_norm[rows], q)
+        k = min(k, len(rows))
+        top = np.argpartition(rank, len(rows) - k)[len(rows) - k:]
+        # 仅对候选集计算精确距离，分数与全量扫描一致
+        scores = -np.linalg.norm(q - self.list_vectors[rows[top]], axis=1)
+        order = np.argsort(-scores, kind='stable')
+        return self.list_items[rows[top[order]]], scores[order]
+
+    def exact_search(self, q, k):
+        """全量精确扫描的 Top-k 物品偏移（无序），作为召回率的参照"""
+        rank = _sq_dist_rank(self.list_vectors, self.list_sq_norm, np.asarray(q, dtype=np.float32))
+        k = min(k, len(rank))
+        return self.list_items[np.argpartition(rank, len(rank) - k)[len(rank) - k:]]
+
+    def measure_recall(self, queries, k, n_probe=None, truth=None):
+        """样本查询上 Top-k 与精确扫描的平均重合率"""
+        k = min(k, len(self.list_items))
+        truth = truth if truth is not None else [self.exact_search(q, k) for q in queries]
+        hits = [len(np.intersect1d(self.search(q, k, n_probe)[0], t)) for q, t in zip(queries, truth)]
+        return float(np.mean(hits)) / k
+
+    def tune_n_probe(self, queries, k, target=ANN_RECALL_TARGET):
+        """
+        n_probe 从 1 起倍增，取样本查询上 Top-k 召回率达到 target 的最小值并设为默认
+        返回 (n_probe, 召回率)；全部簇都扫描时召回率为 1
+        """
+        truth = [self.exact_search(q, k) for q in queries]
+        n_probe = 1
+        while True:
+            recall = self.measure_recall(queries, k, n_probe, truth)
+            if recall >= target or n_probe >= self.n_lists:
+                break
+            n_probe = min(n_probe * 2, self.n_lists)
+        self.n_probe, self.recall = n_probe, recall
+        return n_probe, recall
+
+    def search_batch(self, queries, k, n_probe=None):
+        """逐条查询，返回 (len(queries), k) 的 (物品偏移, 分数)"""
+        k = min(k, len(self.list_items))
+        items = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, q in enumerate(queries):
+            items[i], scores[i] = self.search(q, k, n_probe)
+        return items, scores
@@ -0,0 +1,187 @@
+# =============================================================================
+# 功能：菜品目录只读快照（价格、照片、口味标签、食材），进程内共享
+# 优化：标签/食材以 CSR 数组存储；图谱重新导入后后台自动刷新
+# 归属：服务层性能优化（替代每次请求的 Neo4j 属性查询）
+# 上游：Neo4j 图谱（json2neo4j.py 导入）或 data/menu.json
+# 下游：rec/api/rec_api_stub.py（推荐结果组装）、app/api/dish.py（菜品详情）
+# =============================================================================
+
+from py2neo import Graph
+import numpy as np
+import threading
+import time
+import json
+import os
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_AUTH = (
+    os.getenv("NEO4J_USER", "neo4j"),
+    os.getenv("NEO4J_PASSWORD", "wwj@51816888")
+)
+
+MENU_JSON = 'data/menu.json'
+CATALOG_SOURCE = os.getenv("DISH_CATALOG_SOURCE", "neo4j")  # neo4j | menu
+KG_VERSION_KEY = 'kg:version'  # json2neo4j.py 导入完成后写入的图谱版本号，读写方统一从这里导入
+REFRESH_INTERVAL = int(os.getenv("DISH_CATALOG_REFRESH_SECONDS", "30"))
+
+
+class DishCatalog:
+    """
+    只读菜品目录快照
+    标签/食材按 CSR 存储：第 i 道菜的标签为 tag_vocab[tag_ids[tag_offsets[i]:tag_offsets[i+1]]]
+    """
+
+    def __init__(self, records, version=None):
+        self.version = version
+        self.loaded_at = time.time()
+        self.names = [r['name'] for r in records]
+        self.photos = [r.get('photo') or '' for r in records]
+        self.prices = np.array([r.get('price') or 0 for r in records], dtype=np.int32)
+        self.neo_ids = np.array([r.get('neo_id', -1) for r in records], dtype=np.int64)
+
+        self.tag_vocab, self.tag_offsets, self.tag_ids = self._build_csr([r['tags'] for r in records])
+        self.ing_vocab, self.ing_offsets, self.ing_ids = self._build_csr([r['ingredients'] for r in records])
+
+        self.name_to_idx = {}
+        for idx, name in enumerate(self.names):
+            self.name_to_idx.setdefault(name, idx)
+        self.neo_to_idx = {int(n): idx for idx, n in enumerate(self.neo_ids) if n >= 0}
+
+    @staticmethod
+    def _build_csr(lists):
+        """字符串列表的列表 -> (词表, 偏移数组, 词ID数组)"""
+        vocab = {}
+        offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+        ids = []
+        for i, values in enumerate(lists):
+            for v in values:
+                if v:
+                    ids.append(vocab.setdefault(v, len(vocab)))
+            offsets[i + 1] = len(ids)
+        return list(vocab), offsets, np.array(ids, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index_of(self, name):
+        return self.name_to_idx.get(name)
+
+    def index_of_neo(self, neo_id):
+        return self.neo_to_idx.get(int(neo_id))
+
+    def tags(self, idx):
+        return [self.tag_vocab[t] for t in self.tag_ids[self.tag_offsets[idx]:self.tag_offsets[idx + 1]]]
+
+    def ingredients(self, idx):
+        return [self.ing_vocab[i] for i in self.ing_ids[self.ing_offsets[idx]:self.ing_offsets[idx + 1]]]
+
+    def info(self, idx):
+        """与 get_dish_info_by_names 相同的字典结构"""
+        return {
+            'name': self.names[idx],
+            'price': int(self.prices[idx]),
+            'photo': self.photos[idx],
+            'tags': self.tags(idx),
+            'ingredients': self.ingredients(idx)
+        }
+
+    def info_by_names(self, dish_names):
+        info_map = {}
+        for name in dish_names:
+            idx = self.name_to_idx.get(name)
+            if idx is not None:
+                info_map[name] = self.info(idx)
+        return info_map
+
+    @classmethod
+    def from_neo4j(cls, graph=None, version=None):
+        graph = graph if graph is not None else Graph(NEO4J_URI, auth=NEO4J_AUTH)
+        query = """
+        MATCH (d:Dish)
+        OPTIONAL MATCH (d)-[:HAS_TAG]->(t:Tag)
+        OPTIONAL MATCH (d)-[:CONTAINS]->(i:Ingredient)
+        RETURN id(d) as neo_id, d.name as name, d.price as price, d.file as photo,
+               collect(DISTINCT t.name) as tags,
+               collect(DISTINCT i.name) as ingredients
+        """
+        records = [r for r in graph.run(query).data() if r['name']]
+        return cls(records, version=version)
+
+    @classmethod
+    def from_menu_json(cls, path=MENU_JSON, version=None):
+        """从 excel2json.py 导出的 menu.json 构建（无 Neo4j 节点ID）"""
+        with open(path, 'r', encoding='utf-8') as f:
+            menu = json.load(f)
+        records = [{
+            'name': m['dish'],
+            'price': m.get('price'),
+            'photo': m.get('file'),
+            'tags': m.get('tags', []),
+            'ingredients': m.get('ingredients', [])
+        } for m in menu if m.get('dish')]
+        return cls(records, version=version)
+
+
+# 进程内共享快照：整体替换引用，读者无需加锁
+_catalog = None
+_catalog_lock = threading.Lock()
+_watcher = None
+
+
+def read_kg_version(redis_client):
+    if redis_client is None:
+        return None
+    try:
+        return redis_client.get(KG_VERSION_KEY)
+    except Exception:
+        return None
+
+
+def load_catalog(version=None, graph=None):
+    if CATALOG_SOURCE == 'menu':
+        return DishCatalog.from_menu_json(version=version)
+    try:
+        return DishCatalog.from_neo4j(graph, version=version)
+    except Exception as e:
+        print(f"[CATALOG] 从 Neo4j 加载失败，回退 {MENU_JSON}: {e}", flush=True)
+        return DishCatalog.from_menu_json(version=version)
+
+
+def refresh_catalog(redis_client=None, graph=None):
+    """重建快照并原子替换"""
+    global _catalog
+    catalog = load_catalog(version=read_kg_version(redis_client), graph=graph)
+    _catalog = catalog
+    print(f"[CATALOG] 菜品目录已加载: {len(catalog)} 道菜 (version={catalog.version})", flush=True)
+    return catalog
+
+
+def get_catalog(redis_client=None, graph=None):
+    """获取当前快照；首次调用时加载，并启动后台版本监听"""
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                refresh_catalog(redis_client, graph)
+                start_catalog_watcher(redis_client, graph)
+    return _catalog
+
+
+def _watch_kg_version(redis_client, graph, interval):
+    while True:
+        time.sleep(interval)
+        version = read_kg_version(redis_client)
+        if version is not None and _catalog is not None and version != _catalog.version:
+            try:
+                refresh_catalog(redis_client, graph)
+            except Exception as e:
+                print(f"[CATALOG] 后台刷新失败: {e}", flush=True)
+
+
+def start_catalog_watcher(redis_client, graph=None, interval=REFRESH_INTERVAL):
+    """轮询 Redis 中的图谱版本号，变化时后台重建快照"""
+    global _watcher
+    if redis_client is None or _watcher is not None or interval <= 0:
+        return
+    _watcher = threading.Thread(target=_watch_kg_version, args=(redis_client, graph, interval),
+                                name='dish-catalog-watcher', daemon=True)
+    _watcher.start()
@@ -0,0 +1,150 @@
+# =============================================================================
+# 功能：把 ent_emb/rel_emb/node_map 导出为单个带版本号的嵌入包，服务端以 mmap 只读加载
+# 优化：原始 float32 矩阵 + 数组形式的ID映射，加载无需 torch/pickle 反序列化；
+#       多个 gunicorn worker 映射同一文件，物理内存中只有一份嵌入
+# 归属：服务层性能优化（模型加载）
+# 上游：rec/algo/cache/ent_emb_bpr.pth、rel_emb_bpr.pth、node_map.pkl（ucpr_light.py / neo2dgl.py）
+# 下游：rec/api/rec_api_stub.py（build_model_state）
+# =============================================================================
+#
+# 文件布局（小端）：
+#   8B 魔数 | u32 元数据长度 | 元数据 JSON（utf-8，补齐到 64 字节边界）|
+#   ent float32[n_nodes, EMB] | rel float32[n_relations, EMB] | neo_ids int64[n_nodes]
+#   neo_ids[i] 为连续ID i 对应的 Neo4j 节点ID；各段偏移记录在元数据 offsets 中
+
+import numpy as np
+import struct
+import pickle
+import time
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.model_config import n_users, EMB, RELATIONS, n_relations
+
+CACHE_DIR = 'rec/algo/cache'
+BUNDLE_PATH = os.getenv("EMB_BUNDLE_PATH", os.path.join(CACHE_DIR, 'emb_bundle.bin'))
+MAGIC = b'KGEMB\x00\x00\x01'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+class EmbeddingBundle:
+    """mmap 只读视图；ent/rel/neo_ids 均直接指向文件页，不拷贝"""
+
+    def __init__(self, path, meta, buf):
+        self.path = path
+        self.meta = meta
+        self._buf = buf
+        offsets = meta['offsets']
+        n_nodes, emb = meta['n_nodes'], meta['emb']
+        self.ent = np.frombuffer(buf, dtype='<f4', count=n_nodes * emb, offset=offsets['ent']).reshape(n_nodes, emb)
+        self.rel = np.frombuffer(buf, dtype='<f4', count=meta['n_relations'] * emb,
+                                 offset=offsets['rel']).reshape(meta['n_relations'], emb)
+        self.neo_ids = np.frombuffer(buf, dtype='<i8', count=n_nodes, offset=offsets['neo_ids'])
+
+    @property
+    def version(self):
+        return self.meta['version']
+
+    @property
+    def n_nodes(self):
+        return self.meta['n_nodes']
+
+    def node_map(self):
+        """与 node_map.pkl 相同的 {Neo4j节点ID: 连续ID} 字典"""
+        return {int(neo_id): idx for idx, neo_id in enumerate(self.neo_ids)}
+
+
+def _model_files(cache_dir=CACHE_DIR):
+    """优先BPR模型，否则回退到旧模型"""
+    ent_path = os.path.join(cache_dir, 'ent_emb_bpr.pth')
+    rel_path = os.path.join(cache_dir, 'rel_emb_bpr.pth')
+    if not os.path.exists(ent_path):
+        ent_path = os.path.join(cache_dir, 'ent_emb.pth')
+        rel_path = os.path.join(cache_dir, 'rel_emb.pth')
+    return ent_path, rel_path
+
+
+def export_bundle(output_path=BUNDLE_PATH, ent=None, rel=None, node_map=None, version=None, cache_dir=CACHE_DIR):
+    """
+    写出嵌入包；未传入的部分从 cache_dir 下的 .pth / node_map.pkl 读取
+    先写临时文件再原子替换：已映射旧文件的 worker 不受影响，直到其热更新到新文件
+    """
+    if ent is None or rel is None:
+        from rec.algo.transe_infer import load_state_dict
+        ent_path, rel_path = _model_files(cache_dir)
+        ent = load_state_dict(ent_path)['weight'] if ent is None else ent
+        rel = load_state_dict(rel_path)['weight'] if rel is None else rel
+        if version is None:
+            version = time.strftime('%Y%m%d%H%M%S', time.localtime(os.path.getmtime(ent_path)))
+    if node_map is None:
+        node_map = pickle.load(open(os.path.join(cache_dir, 'node_map.pkl'), 'rb'))
+    version = version or time.strftime('%Y%m%d%H%M%S')
+
+    ent = np.ascontiguousarray(ent, dtype='<f4')
+    rel = np.ascontiguousarray(rel, dtype='<f4')
+    n_nodes = len(node_map)
+    if ent.shape != (n_nodes, EMB):
+        raise ValueError(f"实体嵌入形状 {ent.shape} 与 node_map ({n_nodes}, {EMB}) 不一致")
+    if rel.shape != (n_relations, EMB):
+        raise ValueError(f"关系嵌入形状 {rel.shape} 与 ({n_relations}, {EMB}) 不一致")
+    neo_ids = np.full(n_nodes, -1, dtype='<i8')
+    for neo_id, idx in node_map.items():
+        neo_ids[int(idx)] = int(neo_id)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'n_nodes': n_nodes,
+        'n_users': n_users,
+        'emb': EMB,
+        'n_relations': n_relations,
+        'relations': RELATIONS
+    }
+    # 偏移依赖元数据长度，迭代到不再变化
+    meta['offsets'] = None
+    while True:
+        header_len = len(MAGIC) + 4 + len(json.dumps(meta).encode('utf-8'))
+        start = -(-header_len // ALIGN) * ALIGN
+        offsets = {'ent': start, 'rel': start + ent.nbytes, 'neo_ids': start + ent.nbytes + rel.nbytes}
+        if offsets == meta['offsets']:
+            break
+        meta['offsets'] = offsets
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    meta_bytes += b' ' * (meta['offsets']['ent'] - len(MAGIC) - 4 - len(meta_bytes))
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(ent.tobytes())
+        f.write(rel.tobytes())
+        f.write(neo_ids.tobytes())
+    os.replace(tmp_path, output_path)
+    return meta
+
+
+def load_bundle(path=BUNDLE_PATH):
+    """mmap 加载；文件不存在返回 None，格式或结构常量不符时抛 ValueError"""
+    if not os.path.exists(path):
+        return None
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} 不是嵌入包文件")
+    (meta_len,) = struct.unpack('<I', bytes(buf[len(MAGIC):len(MAGIC) + 4]))
+    meta = json.loads(bytes(buf[len(MAGIC) + 4:len(MAGIC) + 4 + meta_len]).decode('utf-8'))
+    if meta['format'] != FORMAT_VERSION:
+        raise ValueError(f"嵌入包格式版本 {meta['format']} 不受支持")
+    if (meta['n_users'], meta['emb'], meta['relations']) != (n_users, EMB, RELATIONS):
+        raise ValueError(f"嵌入包结构 (n_users={meta['n_users']}, emb={meta['emb']}, relations={meta['relations']}) "
+                         f"与 model_config 不一致")
+    return EmbeddingBundle(path, meta, buf)
+
+
+if __name__ == '__main__':
+    meta = export_bundle()
+    print(f"嵌入包导出完成：{meta['n_nodes']} 个节点，版本 {meta['version']} -> {BUNDLE_PATH}")
@@ -0,0 +1,151 @@
+# =============================================================================
+# 功能：内存知识图谱引擎，枚举 2跳/3跳 解释路径（替代 Neo4j 模式匹配）
+# 优化：Dish-Tag / Dish-Ingredient 正反向邻接均为 CSR 数组，单对路径枚举为微秒级
+# 归属：服务层性能优化（路径解释）
+# 上游：rec/algo/dish_catalog.py（菜品目录快照，含菜名/标签/食材）
+# 下游：rec/algo/path_sampler.py（engine 后端）、rec/api/rec_api_stub.py、app/api/dish.py
+# =============================================================================
+
+import numpy as np
+import threading
+import os
+
+PATH_SAMPLER_BACKEND = os.getenv("PATH_SAMPLER_BACKEND", "neo4j")  # neo4j | memory
+
+
+def reverse_csr(offsets, ids, n_cols):
+    """dish->attr 的 CSR 转置为 attr->dish 的 CSR"""
+    rows = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    order = np.argsort(ids, kind='stable')
+    rev_offsets = np.zeros(n_cols + 1, dtype=np.int32)
+    np.cumsum(np.bincount(ids, minlength=n_cols), out=rev_offsets[1:])
+    return rev_offsets, rows[order]
+
+
+def unique_csr_rows(offsets, ids):
+    """CSR 每行去重并排序（图谱中重复建边时与 Cypher UNION 去重结果一致）"""
+    new_offsets = np.zeros_like(offsets)
+    rows = []
+    for i in range(len(offsets) - 1):
+        row = np.unique(ids[offsets[i]:offsets[i + 1]])
+        rows.append(row)
+        new_offsets[i + 1] = new_offsets[i] + len(row)
+    new_ids = np.concatenate(rows).astype(np.int32) if rows else np.zeros(0, dtype=np.int32)
+    return new_offsets, new_ids
+
+
+class KGEngine:
+    """
+    内存图谱：菜品-标签、菜品-食材 二部图
+    路径输出格式与 PathSampler 一致：[(关系, 实体名), ...]（不含起点）
+    """
+
+    def __init__(self, dish_names, tag_vocab, tag_offsets, tag_ids, ing_vocab, ing_offsets, ing_ids):
+        self.dish_names = list(dish_names)
+        self.tag_vocab = list(tag_vocab)
+        self.ing_vocab = list(ing_vocab)
+
+        self.dish_tag_offsets, self.dish_tag_ids = unique_csr_rows(tag_offsets, tag_ids)
+        self.dish_ing_offsets, self.dish_ing_ids = unique_csr_rows(ing_offsets, ing_ids)
+        self.tag_dish_offsets, self.tag_dish_ids = reverse_csr(self.dish_tag_offsets, self.dish_tag_ids, len(self.tag_vocab))
+        self.ing_dish_offsets, self.ing_dish_ids = reverse_csr(self.dish_ing_offsets, self.dish_ing_ids, len(self.ing_vocab))
+
+        self.name_to_idx = {}
+        for idx, name in enumerate(self.dish_names):
+            self.name_to_idx.setdefault(name, idx)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        engine = cls(catalog.names, catalog.tag_vocab, catalog.tag_offsets, catalog.tag_ids,
+                     catalog.ing_vocab, catalog.ing_offsets, catalog.ing_ids)
+        engine.source = catalog
+        return engine
+
+    # --- 邻接访问 ---
+    def _tags(self, d):
+        return self.dish_tag_ids[self.dish_tag_offsets[d]:self.dish_tag_offsets[d + 1]].tolist()
+
+    def _ings(self, d):
+        return self.dish_ing_ids[self.dish_ing_offsets[d]:self.dish_ing_offsets[d + 1]].tolist()
+
+    def _tag_dishes(self, t):
+        return self.tag_dish_ids[self.tag_dish_offsets[t]:self.tag_dish_offsets[t + 1]].tolist()
+
+    def _ing_dishes(self, i):
+        return self.ing_dish_ids[self.ing_dish_offsets[i]:self.ing_dish_offsets[i + 1]].tolist()
+
+    def _resolve(self, start_dish_name, end_dish_name):
+        s = self.name_to_idx.get(start_dish_name)
+        e = self.name_to_idx.get(end_dish_name)
+        if s is None or e is None or s == e:
+            return None, None
+        return s, e
+
+    # --- 路径枚举 ---
+    def sample_2hop_paths(self, start_dish_name, end_dish_name, limit=5):
+        """Dish-Tag-Dish 与 Dish-Ingredient-Dish，每种最多 limit 条"""
+        s, e = self._resolve(start_dish_name, end_dish_name)
+        if s is None:
+            return []
+        end_name = self.dish_names[e]
+        paths = []
+        end_tags = set(self._tags(e))
+        shared_tags = [t for t in self._tags(s) if t in end_tags][:limit]
+        paths.extend([('HAS_TAG', self.tag_vocab[t]), ('HAS_TAG', end_name)] for t in shared_tags)
+        end_ings = set(self._ings(e))
+        shared_ings = [i for i in self._ings(s) if i in end_ings][:limit]
+        paths.extend([('CONTAINS', self.ing_vocab[i]), ('CONTAINS', end_name)] for i in shared_ings)
+        return paths
+
+    def _enumerate_3hop(self, s, e, first_attrs, first_dishes, first_vocab, first_rel,
+                        second_attrs, second_vocab, second_rel, limit, distinct_attrs):
+        """start -first_rel-> a1 <-first_rel- mid -second_rel-> a2 <-second_rel- end"""
+        end_set = set(second_attrs(e))
+        end_name = self.dish_names[e]
+        paths = []
+        for a1 in first_attrs(s):
+            for mid in first_dishes(a1):
+                if mid == s or mid == e:
+                    continue
+                for a2 in second_attrs(mid):
+                    # 同类型关系时 Cypher 不允许重复使用同一条边（mid->a1）
+                    if a2 not in end_set or (distinct_attrs and a2 == a1):
+                        continue
+                    paths.append([(first_rel, first_vocab[a1]), (first_rel, self.dish_names[mid]),
+                                  (second_rel, second_vocab[a2]), (second_rel, end_name)])
+                    if len(paths) >= limit:
+                        return paths
+        return paths
+
+    def sample_3hop_paths(self, start_dish_name, end_dish_name, limit=3):
+        """三种 3 跳元路径：T-T、I-T、T-I，每种最多 limit 条"""
+        s, e = self._resolve(start_dish_name, end_dish_name)
+        if s is None:
+            return []
+        paths = []
+        # Dish -HAS_TAG-> Tag <-HAS_TAG- Dish -HAS_TAG-> Tag <-HAS_TAG- Dish
+        paths += self._enumerate_3hop(s, e, self._tags, self._tag_dishes, self.tag_vocab, 'HAS_TAG',
+                                      self._tags, self.tag_vocab, 'HAS_TAG', limit, True)
+        # Dish -CONTAINS-> Ingredient <-CONTAINS- Dish -HAS_TAG-> Tag <-HAS_TAG- Dish
+        paths += self._enumerate_3hop(s, e, self._ings, self._ing_dishes, self.ing_vocab, 'CONTAINS',
+                                      self._tags, self.tag_vocab, 'HAS_TAG', limit, False)
+        # Dish -HAS_TAG-> Tag <-HAS_TAG- Dish -CONTAINS-> Ingredient <-CONTAINS- Dish
+        paths += self._enumerate_3hop(s, e, self._tags, self._tag_dishes, self.tag_vocab, 'HAS_TAG',
+                                      self._ings, self.ing_vocab, 'CONTAINS', limit, False)
+        return paths
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_kg_engine(catalog):
+    """按菜品目录快照构建/复用引擎；快照刷新后自动重建"""
+    global _engine
+    engine = _engine
+    if engine is None or engine.source is not catalog:
+        with _engine_lock:
+            engine = _engine
+            if engine is None or engine.source is not catalog:
+                engine = _engine = KGEngine.from_catalog(catalog)
+    return engine
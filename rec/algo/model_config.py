@@ -0,0 +1,11 @@
+# =============================================================================
+# 功能：推荐模型的结构常量（训练、评测、服务、测试共用的唯一来源）
+# 归属：推荐层配置
+# 下游：ucpr_light.py、sample_maker.py、emb_bundle.py、rec/eval/eval.py、
+#       rec/api/rec_api_stub.py、test_optimization.py
+# =============================================================================
+
+n_users = 500                          # node_map 中前 n_users 个连续ID视为用户，其余为物品
+EMB = 32                               # 实体/关系嵌入维度
+RELATIONS = ['HAS_TAG', 'CONTAINS']    # 关系嵌入的行顺序（与 kg_triplet.csv 中出现顺序一致）
+n_relations = len(RELATIONS)
@@ -0,0 +1,164 @@
+# =============================================================================
+# 功能：(历史菜, 目标菜) 路径采样结果缓存（LRU + TTL，线程安全，可选 Redis 二级共享）
+# 优化：路径只依赖静态图谱、与用户无关，热门菜品对跨用户/跨请求复用
+# 归属：服务层性能优化（路径解释）
+# 上游：rec/algo/path_sampler.py（sample_paths_by_name / sample_paths_batch）
+# 下游：rec/api/rec_api_stub.py、app/api/dish.py（进程内共享一个实例）
+# 失效：json2neo4j.py 重建图谱后更新 Redis 中的 kg:version，缓存检测到版本变化即整体作废
+# =============================================================================
+
+from collections import OrderedDict
+import threading
+import hashlib
+import json
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.dish_catalog import KG_VERSION_KEY
+PATH_CACHE_SIZE = int(os.getenv("PATH_CACHE_SIZE", "20000"))
+PATH_CACHE_TTL = int(os.getenv("PATH_CACHE_TTL", str(6 * 3600)))
+PATH_CACHE_REDIS = os.getenv("PATH_CACHE_REDIS", "1") == "1"   # 是否使用 Redis 在 worker 间共享
+VERSION_CHECK_INTERVAL = 5  # 秒，检查图谱版本号的最小间隔
+
+
+class PairPathCache:
+    """
+    菜品对路径缓存
+    - 本地：OrderedDict 实现 LRU，条目带过期时间
+    - Redis（可选）：key 含图谱版本号，图谱重建后旧 key 自然失效并随 TTL 过期
+    """
+
+    def __init__(self, max_size=PATH_CACHE_SIZE, ttl=PATH_CACHE_TTL, redis_client=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self._entries = OrderedDict()  # (start, end) -> (expire_at, paths)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self._stats = {'hits': 0, 'redis_hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0}
+
+    # --- 版本与失效 ---
+    def _check_version(self):
+        if self.redis_client is None:
+            return
+        now = time.time()
+        if now - self._version_checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        try:
+            version = self.redis_client.get(KG_VERSION_KEY)
+        except Exception:
+            return
+        if version != self._version:
+            with self._lock:
+                if self._version is not None:
+                    self._entries.clear()
+                    self._stats['invalidations'] += 1
+                self._version = version
+
+    def invalidate(self):
+        """清空本地缓存（Redis 侧依赖版本号切换）"""
+        with self._lock:
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def _redis_key(self, start, end):
+        digest = hashlib.md5(f"{start}\x1f{end}".encode()).hexdigest()
+        return f"path:{self._version or 0}:{digest}"
+
+    # --- 本地 LRU ---
+    def _local_get(self, pair, now):
+        entry = self._entries.get(pair)
+        if entry is None:
+            return None
+        expire_at, paths = entry
+        if expire_at < now:
+            del self._entries[pair]
+            self._stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(pair)
+        return paths
+
+    def _local_set(self, pair, paths, now):
+        self._entries[pair] = (now + self.ttl, paths)
+        self._entries.move_to_end(pair)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    # --- 对外接口 ---
+    def get_many(self, pairs):
+        """返回 {pair: paths}，只包含命中的菜品对"""
+        self._check_version()
+        now = time.time()
+        found = {}
+        with self._lock:
+            for pair in pairs:
+                paths = self._local_get(pair, now)
+                if paths is not None:
+                    found[pair] = paths
+            self._stats['hits'] += len(found)
+
+        missing = [pair for pair in dict.fromkeys(pairs) if pair not in found]
+        if missing and self.redis_client is not None:
+            try:
+                values = self.redis_client.mget([self._redis_key(*pair) for pair in missing])
+            except Exception:
+                values = [None] * len(missing)
+            with self._lock:
+                for pair, value in zip(missing, values):
+                    if value:
+                        paths = [[tuple(step) for step in path] for path in json.loads(value)]
+                        found[pair] = paths
+                        self._local_set(pair, paths, now)
+                        self._stats['redis_hits'] += 1
+
+        with self._lock:
+            self._stats['misses'] += sum(1 for pair in missing if pair not in found)
+        return found
+
+    def get(self, start, end):
+        return self.get_many([(start, end)]).get((start, end))
+
+    def set_many(self, pair_paths):
+        now = time.time()
+        with self._lock:
+            for pair, paths in pair_paths.items():
+                self._local_set(pair, paths, now)
+        if self.redis_client is not None and pair_paths:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for pair, paths in pair_paths.items():
+                    pipe.setex(self._redis_key(*pair), self.ttl, json.dumps(paths, ensure_ascii=False))
+                pipe.execute()
+            except Exception:
+                pass
+
+    def set(self, start, end, paths):
+        self.set_many({(start, end): paths})
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['redis_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_path_cache(redis_client=None):
+    """进程内共享的路径缓存实例"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PairPathCache(redis_client=redis_client if PATH_CACHE_REDIS else None)
+    return _cache
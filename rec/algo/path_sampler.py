@@ -14,6 +14,60 @@ from collections import defaultdict
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_AUTH = ("neo4j", "wwj@51816888")
 
+# sample_paths_batch 中 CALL 子查询的各分支（每个 pair 独立 LIMIT）
+# 2 跳分支只对 need_2hop 的 pair 执行（共享属性索引能覆盖的 pair 直接查表）
+BATCH_2HOP_BRANCHES = [
+    """
+        WITH pair
+        WITH pair WHERE pair.need_2hop
+        MATCH (start:Dish {name: pair.start})-[:HAS_TAG]->(t:Tag)<-[:HAS_TAG]-(end:Dish {name: pair.end})
+        WHERE start <> end
+        RETURN ['HAS_TAG', 'HAS_TAG'] as rels,
+               [start.name, t.name, end.name] as entities,
+               2 as path_len
+        LIMIT 5
+    """,
+    """
+        WITH pair
+        WITH pair WHERE pair.need_2hop
+        MATCH (start:Dish {name: pair.start})-[:CONTAINS]->(i:Ingredient)<-[:CONTAINS]-(end:Dish {name: pair.end})
+        WHERE start <> end
+        RETURN ['CONTAINS', 'CONTAINS'] as rels,
+               [start.name, i.name, end.name] as entities,
+               2 as path_len
+        LIMIT 5
+    """,
+]
+BATCH_3HOP_BRANCHES = [
+    """
+        WITH pair
+        MATCH (start:Dish {name: pair.start})-[:HAS_TAG]->(t1:Tag)<-[:HAS_TAG]-(mid:Dish)-[:HAS_TAG]->(t2:Tag)<-[:HAS_TAG]-(end:Dish {name: pair.end})
+        WHERE start <> mid AND mid <> end AND start <> end
+        RETURN ['HAS_TAG', 'HAS_TAG', 'HAS_TAG', 'HAS_TAG'] as rels,
+               [start.name, t1.name, mid.name, t2.name, end.name] as entities,
+               4 as path_len
+        LIMIT 3
+    """,
+    """
+        WITH pair
+        MATCH (start:Dish {name: pair.start})-[:CONTAINS]->(i:Ingredient)<-[:CONTAINS]-(mid:Dish)-[:HAS_TAG]->(t:Tag)<-[:HAS_TAG]-(end:Dish {name: pair.end})
+        WHERE start <> mid AND mid <> end AND start <> end
+        RETURN ['CONTAINS', 'CONTAINS', 'HAS_TAG', 'HAS_TAG'] as rels,
+               [start.name, i.name, mid.name, t.name, end.name] as entities,
+               4 as path_len
+        LIMIT 3
+    """,
+    """
+        WITH pair
+        MATCH (start:Dish {name: pair.start})-[:HAS_TAG]->(t:Tag)<-[:HAS_TAG]-(mid:Dish)-[:CONTAINS]->(i:Ingredient)<-[:CONTAINS]-(end:Dish {name: pair.end})
+        WHERE start <> mid AND mid <> end AND start <> end
+        RETURN ['HAS_TAG', 'HAS_TAG', 'CONTAINS', 'CONTAINS'] as rels,
+               [start.name, t.name, mid.name, i.name, end.name] as entities,
+               4 as path_len
+        LIMIT 3
+    """,
+]
+
 
 class PathSampler:
     """
@@ -21,8 +75,15 @@ class PathSampler:
     支持路径：2跳（Dish-Tag-Dish）和3跳（Dish-Tag-Dish-Tag-Dish）
     """
 
-    def __init__(self):
-        self.graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
+    def __init__(self, graph=None, engine=None, shared_index=None, path_cache=None):
+        # 服务端传入共享连接池（app.extensions.neo4j_client），离线脚本默认自建连接
+        self.graph = graph if graph is not None else Graph(NEO4J_URI, auth=NEO4J_AUTH)
+        # 传入 KGEngine 时路径枚举走内存图谱，用户历史仍查询 Neo4j
+        self.engine = engine
+        # 传入 SharedAttrIndex 时 2 跳路径直接查预计算的共享属性表（索引未覆盖的菜品对回退）
+        self.shared_index = shared_index
+        # 传入 PairPathCache 时按 (起点菜, 终点菜) 复用采样结果（与用户无关）
+        self.path_cache = path_cache
         self.max_path_len = 4  # 最大路径长度（3跳=4个节点）
         self.sample_size = 10  # 每对用户-物品采样路径数
 
@@ -37,6 +98,10 @@ class PathSampler:
 
     def sample_2hop_paths(self, start_dish_name, end_dish_name):
         """2跳路径：Dish-Tag-Dish 或 Dish-Ingredient-Dish"""
+        if self.shared_index is not None and self.shared_index.covers(start_dish_name, end_dish_name):
+            return self.shared_index.sample_2hop_paths(start_dish_name, end_dish_name)
+        if self.engine is not None:
+            return self.engine.sample_2hop_paths(start_dish_name, end_dish_name)
         query = """
         MATCH (start:Dish {name: $start_name})-[:HAS_TAG]->(t:Tag)<-[:HAS_TAG]-(end:Dish {name: $end_name})
         WHERE start <> end
@@ -64,6 +129,8 @@ class PathSampler:
 
     def sample_3hop_paths(self, start_dish_name, end_dish_name):
         """3跳路径：Dish-Tag-Dish-Tag-Dish 等混合路径"""
+        if self.engine is not None:
+            return self.engine.sample_3hop_paths(start_dish_name, end_dish_name)
         query = """
         // 路径1: DishA -[HAS_TAG]-> Tag1 <-[HAS_TAG]- DishB -[HAS_TAG]-> Tag2 <-[HAS_TAG]- DishC
         MATCH (start:Dish {name: $start_name})-[:HAS_TAG]->(t1:Tag)<-[:HAS_TAG]-(mid:Dish)-[:HAS_TAG]->(t2:Tag)<-[:HAS_TAG]-(end:Dish {name: $end_name})
@@ -103,11 +170,23 @@ class PathSampler:
 
     def sample_paths_by_name(self, start_dish_name, end_dish_name):
         """合并2跳和3跳路径采样"""
+        if self.path_cache is not None:
+            cached = self.path_cache.get(start_dish_name, end_dish_name)
+            if cached is not None:
+                return cached
+
+        paths = self._sample_pair(start_dish_name, end_dish_name)
+        if self.path_cache is not None:
+            self.path_cache.set(start_dish_name, end_dish_name, paths)
+        return paths
+
+    def _sample_pair(self, start_dish_name, end_dish_name):
         paths_2hop = self.sample_2hop_paths(start_dish_name, end_dish_name)
         paths_3hop = self.sample_3hop_paths(start_dish_name, end_dish_name)
+        return self._merge_paths(paths_2hop + paths_3hop)
 
-        # 合并并去重
-        all_paths = paths_2hop + paths_3hop
+    def _merge_paths(self, all_paths):
+        """按路径模式去重并截断到 sample_size"""
         seen = set()
         unique_paths = []
         for p in all_paths:
@@ -118,20 +197,72 @@ class PathSampler:
 
         return unique_paths[:self.sample_size]
 
-    def sample_paths_for_user_item(self, user_id, target_dish_name):
-        """为特定用户-目标菜品采样解释路径"""
-        history = self.get_user_interacted_items(user_id)
-        if not history:
-            return []
+    def sample_paths_batch(self, pairs):
+        """
+        批量采样：一次 UNWIND 查询完成多个 (起点菜, 终点菜) 对的 2跳+3跳 路径采样
+        pairs: [(start_name, end_name), ...]
+        返回 {(start_name, end_name): paths}，每对结果与 sample_paths_by_name 一致
+        """
+        if not pairs:
+            return {}
+        cached = self.path_cache.get_many(pairs) if self.path_cache is not None else {}
+        todo = [pair for pair in dict.fromkeys(pairs) if pair not in cached]
+        computed = self._sample_paths_batch_uncached(todo) if todo else {}
+        if self.path_cache is not None and computed:
+            self.path_cache.set_many(computed)
+        return {pair: cached[pair] if pair in cached else computed[pair] for pair in pairs}
+
+    def _sample_paths_batch_uncached(self, pairs):
+        if self.engine is not None:
+            return {pair: self._sample_pair(*pair) for pair in pairs}
+        # 共享属性索引覆盖的菜品对 2 跳直接查表，其余菜品对（不在索引中或被 top_m 截断）向 Neo4j 请求 2 跳
+        unique_pairs = list(dict.fromkeys(pairs))
+        indexed = {pair for pair in unique_pairs
+                   if self.shared_index is not None and self.shared_index.covers(*pair)}
+        branches = BATCH_3HOP_BRANCHES
+        if len(indexed) < len(unique_pairs):
+            branches = BATCH_2HOP_BRANCHES + BATCH_3HOP_BRANCHES
+        query = (
+            "UNWIND $pairs AS pair\nCALL {"
+            + "\nUNION\n".join(branches)
+            + "}\nRETURN pair.start as start, pair.end as end, rels, entities, path_len"
+        )
+        params = [{'start': start, 'end': end, 'need_2hop': (start, end) not in indexed}
+                  for start, end in unique_pairs]
+        result = self.graph.run(query, pairs=params).data()
+
+        grouped = defaultdict(list)
+        for start, end in indexed:
+            grouped[(start, end)].extend((2, p) for p in self.shared_index.sample_2hop_paths(start, end))
+        for record in result:
+            path = list(zip(record['rels'], record['entities'][1:]))
+            grouped[(record['start'], record['end'])].append((record['path_len'], path))
 
-        # 去重历史菜名，优先高评分
+        # 与 sample_paths_by_name 保持一致：2跳在前、3跳在后，再按模式去重
+        return {
+            pair: self._merge_paths([p for _, p in sorted(grouped.get(pair, []), key=lambda x: x[0])])
+            for pair in pairs
+        }
+
+    def _rank_history_names(self, history):
+        """历史菜名去重，优先高评分"""
         hist_names = []
         seen = set()
         for h in sorted(history, key=lambda x: x.get('rating', 0), reverse=True):
             name = h['dish_name']
-            if name not in seen and name != target_dish_name:
+            if name not in seen:
                 seen.add(name)
                 hist_names.append(name)
+        return hist_names
+
+    def sample_paths_for_user_item(self, user_id, target_dish_name):
+        """为特定用户-目标菜品采样解释路径"""
+        history = self.get_user_interacted_items(user_id)
+        if not history:
+            return []
+
+        # 去重历史菜名，优先高评分
+        hist_names = [n for n in self._rank_history_names(history) if n != target_dish_name]
 
         paths = []
         for hist_name in hist_names[:5]:  # 取前5个不同历史菜品
@@ -141,6 +272,34 @@ class PathSampler:
 
         return paths[:self.sample_size]
 
+    def sample_paths_for_user_items(self, user_id, target_dish_names, history=None):
+        """
+        批量版 sample_paths_for_user_item：历史查询 1 次 + 路径采样 1 次 UNWIND 查询
+        返回 {target_dish_name: paths}，每个目标的结果与逐个调用一致
+        """
+        if history is None:
+            history = self.get_user_interacted_items(user_id)
+        if not history:
+            return {name: [] for name in target_dish_names}
+
+        ranked = self._rank_history_names(history)
+        target_hist = {}
+        pairs = []
+        for target in target_dish_names:
+            hist_names = [n for n in ranked if n != target][:5]  # 取前5个不同历史菜品
+            target_hist[target] = hist_names
+            pairs.extend((hist_name, target) for hist_name in hist_names)
+
+        pair_paths = self.sample_paths_batch(pairs)
+
+        result = {}
+        for target, hist_names in target_hist.items():
+            paths = []
+            for hist_name in hist_names:
+                paths.extend(pair_paths.get((hist_name, target), []))
+            result[target] = paths[:self.sample_size]
+        return result
+
     def get_path_pattern(self, path):
         """提取路径模式（用于 Diversity 计算）"""
         return "->".join([rel for rel, _ in path])
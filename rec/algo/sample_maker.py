@@ -7,9 +7,13 @@
 
 import pandas as pd
 import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.model_config import n_users   # 假设前 n_users 个节点当“用户”⚠️
 
 node_map = pd.read_pickle('rec/algo/cache/node_map.pkl')    # 加载节点映射，获取总节点数
-n_users = 500          # 假设前 500 个节点当“用户”⚠️
 n_items = len(node_map) - n_users   # 物品数 = 总节点 - 用户数
 
 
@@ -0,0 +1,253 @@
+# =============================================================================
+# 功能：离线预计算任意两道菜共享的口味标签/食材（2跳解释路径的全部信息）
+# 优化：菜品×标签、菜品×食材 稀疏关联矩阵做 A·Aᵀ 乘积，结果按菜品行存为 CSR
+#       .npy 文件，服务端以 mmap 方式只读加载，2跳解释由图查询变为数组查找
+# 归属：服务层性能优化（路径解释）
+# 上游：rec/algo/dish_catalog.py（Neo4j 或 data/menu.json）
+# 下游：rec/algo/path_sampler.py（shared_index 参数）、rec/api/rec_api_stub.py
+# 版本：meta.version 为构建时的 kg:version，与当前图谱版本不一致的索引不使用（路径采样回退图查询）
+# =============================================================================
+
+import numpy as np
+import threading
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.kg_engine import reverse_csr, unique_csr_rows
+from rec.algo.dish_catalog import read_kg_version
+
+INDEX_DIR = os.getenv("SHARED_ATTR_INDEX_DIR", "rec/algo/cache/shared_attr")
+TOP_M = int(os.getenv("SHARED_ATTR_TOP_M", "0"))  # 每道菜保留共享属性最多的 M 个邻居，0 表示保留全部
+ARRAYS = ('pair_offsets', 'pair_partner', 'pair_tag_count', 'pair_ing_count', 'attr_offsets', 'attr_ids')
+
+
+class SharedAttrIndex:
+    """
+    菜品对共享属性索引
+    第 s 道菜的邻居为 pair_partner[pair_offsets[s]:pair_offsets[s+1]]（升序）
+    第 p 个菜品对的共享属性为 attr_ids[attr_offsets[p]:attr_offsets[p+1]]，
+    属性ID < n_tags 为标签，否则为食材（减去 n_tags 后查食材词表）
+    """
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.dish_names = meta['dish_names']
+        self.tag_vocab = meta['tag_vocab']
+        self.ing_vocab = meta['ing_vocab']
+        self.n_tags = len(self.tag_vocab)
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self.name_to_idx = {}
+        for idx, name in enumerate(self.dish_names):
+            self.name_to_idx.setdefault(name, idx)
+
+    @property
+    def version(self):
+        return self.meta.get('version')
+
+    def _pair_position(self, start_dish_name, end_dish_name):
+        s = self.name_to_idx.get(start_dish_name)
+        e = self.name_to_idx.get(end_dish_name)
+        if s is None or e is None or s == e:
+            return None
+        lo, hi = int(self.pair_offsets[s]), int(self.pair_offsets[s + 1])
+        k = lo + int(np.searchsorted(self.pair_partner[lo:hi], e))
+        if k >= hi or self.pair_partner[k] != e:
+            return None
+        return k
+
+    def covers(self, start_dish_name, end_dish_name):
+        """
+        索引能否给出该菜品对的完整 2 跳结果：两道菜都在索引中，且索引未截断邻居（top_m=0，
+        缺失即无共享属性）或该对在保留的 top_m 个邻居中；否则调用方应回退到图查询
+        """
+        if start_dish_name not in self.name_to_idx or end_dish_name not in self.name_to_idx:
+            return False
+        return not self.meta.get('top_m') or self._pair_position(start_dish_name, end_dish_name) is not None
+
+    def shared_attrs(self, start_dish_name, end_dish_name):
+        """返回 (共享标签列表, 共享食材列表)"""
+        p = self._pair_position(start_dish_name, end_dish_name)
+        if p is None:
+            return [], []
+        attrs = self.attr_ids[self.attr_offsets[p]:self.attr_offsets[p + 1]].tolist()
+        tags = [self.tag_vocab[a] for a in attrs if a < self.n_tags]
+        ings = [self.ing_vocab[a - self.n_tags] for a in attrs if a >= self.n_tags]
+        return tags, ings
+
+    def shared_counts(self, start_dish_name, end_dish_name):
+        """返回 (共享标签数, 共享食材数)"""
+        p = self._pair_position(start_dish_name, end_dish_name)
+        if p is None:
+            return 0, 0
+        return int(self.pair_tag_count[p]), int(self.pair_ing_count[p])
+
+    def sample_2hop_paths(self, start_dish_name, end_dish_name, limit=5):
+        """与 PathSampler.sample_2hop_paths 输出格式相同"""
+        tags, ings = self.shared_attrs(start_dish_name, end_dish_name)
+        paths = [[('HAS_TAG', t), ('HAS_TAG', end_dish_name)] for t in tags[:limit]]
+        paths += [[('CONTAINS', i), ('CONTAINS', end_dish_name)] for i in ings[:limit]]
+        return paths
+
+
+def _attr_pairs(offsets, ids, n_attrs, attr_base):
+    """稀疏乘积 A·Aᵀ 的展开：对每个属性列，其下所有菜品两两成对"""
+    col_offsets, col_dishes = reverse_csr(offsets, ids, n_attrs)
+    sizes = np.diff(col_offsets)
+    starts, ends, attrs = [], [], []
+    for a in np.flatnonzero(sizes > 1):
+        dishes = col_dishes[col_offsets[a]:col_offsets[a + 1]]
+        k = len(dishes)
+        s = np.repeat(dishes, k)
+        e = np.tile(dishes, k)
+        keep = s != e
+        starts.append(s[keep])
+        ends.append(e[keep])
+        attrs.append(np.full(int(keep.sum()), attr_base + a, dtype=np.int32))
+    if not starts:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+    return np.concatenate(starts), np.concatenate(ends), np.concatenate(attrs)
+
+
+def build_shared_attr_index(catalog, top_m=TOP_M):
+    """由菜品目录快照构建共享属性索引"""
+    n_dishes = len(catalog)
+    n_tags = len(catalog.tag_vocab)
+    tag_offsets, tag_ids = unique_csr_rows(catalog.tag_offsets, catalog.tag_ids)
+    ing_offsets, ing_ids = unique_csr_rows(catalog.ing_offsets, catalog.ing_ids)
+
+    s_t, e_t, a_t = _attr_pairs(tag_offsets, tag_ids, n_tags, 0)
+    s_i, e_i, a_i = _attr_pairs(ing_offsets, ing_ids, len(catalog.ing_vocab), n_tags)
+    starts = np.concatenate([s_t, s_i]).astype(np.int64)
+    ends = np.concatenate([e_t, e_i]).astype(np.int64)
+    attrs = np.concatenate([a_t, a_i]).astype(np.int32)
+
+    # 按 (起点, 终点, 属性) 排序，相邻相同 (起点, 终点) 即同一菜品对
+    order = np.lexsort((attrs, ends, starts))
+    starts, ends, attrs = starts[order], ends[order], attrs[order]
+    pair_key = starts * n_dishes + ends
+    boundary = np.flatnonzero(np.r_[True, pair_key[1:] != pair_key[:-1]])
+    pair_start = starts[boundary]
+    pair_end = ends[boundary]
+    attr_offsets = np.r_[boundary, len(attrs)].astype(np.int64)
+    is_tag = (attrs < n_tags).astype(np.int32)
+    tag_count = np.add.reduceat(is_tag, boundary) if len(boundary) else np.zeros(0, dtype=np.int32)
+    ing_count = np.diff(attr_offsets) - tag_count
+
+    if top_m and len(boundary):
+        # 每道菜只保留共享属性总数最多的 top_m 个邻居
+        total = tag_count + ing_count
+        rank_order = np.lexsort((pair_end, -total, pair_start))
+        group_first = np.searchsorted(pair_start[rank_order], pair_start[rank_order])
+        rank = np.arange(len(rank_order)) - group_first
+        keep = np.sort(rank_order[rank < top_m])
+        attr_rows = [attrs[attr_offsets[p]:attr_offsets[p + 1]] for p in keep]
+        attrs = np.concatenate(attr_rows) if attr_rows else np.zeros(0, dtype=np.int32)
+        attr_offsets = np.r_[0, np.cumsum([len(r) for r in attr_rows])].astype(np.int64)
+        pair_start, pair_end = pair_start[keep], pair_end[keep]
+        tag_count, ing_count = tag_count[keep], ing_count[keep]
+
+    pair_offsets = np.zeros(n_dishes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_start, minlength=n_dishes), out=pair_offsets[1:])
+
+    meta = {
+        'version': catalog.version,
+        'top_m': top_m,
+        'n_pairs': int(len(pair_end)),
+        'dish_names': list(catalog.names),
+        'tag_vocab': list(catalog.tag_vocab),
+        'ing_vocab': list(catalog.ing_vocab)
+    }
+    arrays = {
+        'pair_offsets': pair_offsets,
+        'pair_partner': pair_end.astype(np.int32),
+        'pair_tag_count': tag_count.astype(np.uint16),
+        'pair_ing_count': ing_count.astype(np.uint16),
+        'attr_offsets': attr_offsets,
+        'attr_ids': attrs.astype(np.int32)
+    }
+    return SharedAttrIndex(meta, arrays)
+
+
+def save_shared_attr_index(index, output_dir=INDEX_DIR):
+    """数组先写、meta.json 最后写：服务端据 meta.json 的修改时间判断索引是否已重建"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(output_dir, f'{name}.npy'), np.ascontiguousarray(getattr(index, name)))
+    with open(os.path.join(output_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(index.meta, f, ensure_ascii=False)
+
+
+def load_shared_attr_index(index_dir=INDEX_DIR):
+    """以 mmap 只读方式加载（多个 worker 共享同一份页缓存）；索引不存在时返回 None"""
+    meta_path = os.path.join(index_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+    return SharedAttrIndex(meta, arrays)
+
+
+_index = None
+_index_source = None  # (kg:version, meta.json 修改时间)：任一变化时重新加载并校验
+_index_lock = threading.Lock()
+
+
+def _index_mtime(index_dir=INDEX_DIR):
+    try:
+        return os.stat(os.path.join(index_dir, 'meta.json')).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_checked(kg_version):
+    """加载磁盘上的索引；图谱版本已知且与索引构建时的版本不一致时返回 None"""
+    try:
+        index = load_shared_attr_index()
+    except Exception as e:
+        print(f"[PATH] 加载共享属性索引失败: {e}", flush=True)
+        return None
+    if index is None:
+        return None
+    if kg_version is not None and str(index.version) != str(kg_version):
+        print(f"[PATH] 共享属性索引版本 {index.version} 与图谱版本 {kg_version} 不一致，暂不使用"
+              f"（重新运行 python rec/algo/shared_attr_index.py 后自动加载）", flush=True)
+        return None
+    print(f"[PATH] 加载共享属性索引: {index.meta['n_pairs']} 个菜品对 (version={index.version})", flush=True)
+    return index
+
+
+def get_shared_attr_index(redis_client=None):
+    """
+    返回与当前图谱版本一致的索引；未生成或版本不一致时返回 None（路径采样回退到内存图谱/图查询）
+    每次调用读一次 kg:version（不节流，不会比路径缓存更晚发现图谱重建），
+    图谱版本或索引文件变化时重新加载
+    """
+    global _index, _index_source
+    kg_version = read_kg_version(redis_client)
+    if kg_version is None and _index_source is not None:
+        kg_version = _index_source[0]  # Redis 暂不可用时沿用上次的判断，不反复重载
+    source = (kg_version, _index_mtime())
+    if source != _index_source:
+        with _index_lock:
+            if source != _index_source:
+                _index = _load_checked(source[0])
+                _index_source = source
+    return _index
+
+
+if __name__ == '__main__':
+    from redis import Redis
+    from rec.algo.dish_catalog import load_catalog
+
+    # 记录构建时的图谱版本，服务端据此判断索引是否过期
+    redis_client = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True)
+    catalog = load_catalog(version=read_kg_version(redis_client))
+    index = build_shared_attr_index(catalog)
+    save_shared_attr_index(index)
+    print(f'共享属性索引完成：{len(catalog)} 道菜，{index.meta["n_pairs"]} 个菜品对 -> {INDEX_DIR}')
@@ -0,0 +1,136 @@
+# =============================================================================
+# 功能：纯 NumPy 的 TransE 推理（读取导出的嵌入，复现 UCPRModel 的打分 -||u + r - item||）
+# 优化：服务进程不再依赖 torch：.pth 检查点按 torch 的 zip 存档格式直接解析为 NumPy 数组，
+#       不实例化 UCPRModel（省去 Xavier 初始化/归一化后又被 load_state_dict 覆盖的开销）
+# 归属：服务层性能优化（模型加载 / 推理依赖瘦身）
+# 上游：rec/algo/cache/ent_emb_bpr.pth、rel_emb_bpr.pth（ucpr_light.py）、emb_bundle.bin
+# 下游：rec/api/rec_api_stub.py（build_model_state）、test_optimization.py（与 UCPRModel 一致性测试）
+# =============================================================================
+
+import numpy as np
+import zipfile
+import pickle
+import sys
+import os
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.model_config import n_users, EMB, n_relations
+
+# torch 存储类型 -> NumPy dtype（嵌入表只会用到浮点类型，其余列出便于报错信息准确）
+_STORAGE_DTYPES = {
+    'FloatStorage': np.float32,
+    'DoubleStorage': np.float64,
+    'HalfStorage': np.float16,
+    'LongStorage': np.int64,
+    'IntStorage': np.int32,
+}
+
+
+class _StorageType:
+    def __init__(self, name):
+        if name not in _STORAGE_DTYPES:
+            raise ValueError(f"不支持的张量存储类型 torch.{name}")
+        self.dtype = np.dtype(_STORAGE_DTYPES[name])
+
+
+def _rebuild_tensor(storage, storage_offset, size, stride, *args):
+    """对应 torch._utils._rebuild_tensor_v2：按 offset/stride（以元素计）从存储中取出数组"""
+    itemsize = storage.dtype.itemsize
+    view = np.lib.stride_tricks.as_strided(storage[storage_offset:], shape=tuple(size),
+                                           strides=tuple(s * itemsize for s in stride))
+    return np.array(view)
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    """只放行 state_dict 用到的少数全局名，其余一律拒绝（检查点不执行任意代码）"""
+
+    def __init__(self, file, archive, prefix, byteorder):
+        super().__init__(file)
+        self._archive = archive
+        self._prefix = prefix
+        self._byteorder = '<' if byteorder == 'little' else '>'
+
+    def find_class(self, module, name):
+        if (module, name) == ('collections', 'OrderedDict'):
+            return OrderedDict
+        if (module, name) == ('torch._utils', '_rebuild_tensor_v2'):
+            return _rebuild_tensor
+        if module == 'torch' and name.endswith('Storage'):
+            return _StorageType(name)
+        raise pickle.UnpicklingError(f"检查点中包含不支持的对象 {module}.{name}")
+
+    def persistent_load(self, pid):
+        # ('storage', 存储类型, 存储文件名, 设备, 元素数)
+        _, storage_type, key, _, numel = pid
+        raw = self._archive.read(f"{self._prefix}/data/{key}")
+        return np.frombuffer(raw, dtype=storage_type.dtype.newbyteorder(self._byteorder), count=numel)
+
+
+def load_state_dict(path):
+    """不导入 torch 读取 torch.save 写出的 state_dict，返回 {参数名: np.ndarray}"""
+    if not zipfile.is_zipfile(path):
+        # torch 1.6 之前的旧序列化格式，只能交给 torch 读取
+        import torch
+        return {k: v.cpu().numpy() for k, v in torch.load(path, map_location='cpu').items()}
+    with zipfile.ZipFile(path) as archive:
+        pkl_name = next(n for n in archive.namelist() if n.endswith('/data.pkl'))
+        prefix = pkl_name[:-len('/data.pkl')]
+        byteorder_name = f"{prefix}/byteorder"
+        byteorder = archive.read(byteorder_name).decode() if byteorder_name in archive.namelist() else 'little'
+        with archive.open(pkl_name) as f:
+            state = _CheckpointUnpickler(f, archive, prefix, byteorder).load()
+    return dict(state)
+
+
+def load_checkpoint_embeddings(ent_path, rel_path, n_nodes):
+    """
+    从 .pth 读取并校验 (ent, rel)，均为 float32
+    旧模型没有关系嵌入文件时 rel 取全零（原实现此时用未训练的随机初始化，打分不可复现）
+    """
+    ent = np.ascontiguousarray(load_state_dict(ent_path)['weight'], dtype=np.float32)
+    if ent.shape != (n_nodes, EMB):
+        raise ValueError(f"实体嵌入形状 {ent.shape} 与 node_map ({n_nodes}, {EMB}) 不一致")
+    if rel_path:
+        rel = np.ascontiguousarray(load_state_dict(rel_path)['weight'], dtype=np.float32)
+        if rel.shape != (n_relations, EMB):
+            raise ValueError(f"关系嵌入形状 {rel.shape} 与 ({n_relations}, {EMB}) 不一致")
+    else:
+        rel = np.zeros((n_relations, EMB), dtype=np.float32)
+    return ent, rel
+
+
+class TransEScorer:
+    """
+    推理专用的 TransE 打分器，分数与 UCPRModel.forward 的 pos_score 一致：
+    score(u, i) = -||ent[u] + rel[r] - ent[i]||
+    ent/rel 可以是嵌入包的 mmap 只读视图，打分过程不修改也不拷贝整张表
+    """
+
+    def __init__(self, ent, rel):
+        self.ent = ent
+        self.rel = rel
+
+    @classmethod
+    def from_checkpoint(cls, ent_path, rel_path, n_nodes):
+        return cls(*load_checkpoint_embeddings(ent_path, rel_path, n_nodes))
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        return cls(bundle.ent, bundle.rel)
+
+    @property
+    def n_items(self):
+        return self.ent.shape[0] - n_users
+
+    def score(self, users, items, relations=0):
+        """逐对打分：users/items 为连续ID（物品已含 n_users 偏移），relations 可为标量"""
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        diff = self.ent[users] + self.rel[relations] - self.ent[items]
+        return -np.linalg.norm(diff, axis=-1)
+
+    def score_items(self, user_id, relation=0):
+        """单个用户对全部物品的打分，下标为物品偏移（连续ID - n_users）"""
+        q = self.ent[user_id] + self.rel[relation]
+        return -np.linalg.norm(q - self.ent[n_users:], axis=1)
@@ -0,0 +1,236 @@
+# =============================================================================
+# 功能：基于线上反馈的增量热启动训练（只微调有新反馈的用户/菜品行）
+# 优化：从当前 ent_emb_bpr.pth / rel_emb_bpr.pth 继续训练，只读取水位线之后新增的反馈，
+#       其余实体行与关系嵌入冻结不变；几秒内产出新版本模型，服务端热更新自动加载
+# 归属：训练层性能优化（模型新鲜度）
+# 上游：data/experiment/feedback_log.jsonl（app/api/feedback.py 追加写入）
+#       rec/algo/cache/samples.csv、ent_emb_bpr.pth、rel_emb_bpr.pth、node_map.pkl
+# 下游：rec/algo/cache/ent_emb_bpr.pth、rel_emb_bpr.pth、emb_bundle.bin（rec_api_stub 文件监听热更新）
+#       rec/algo/cache/checkpoints/<版本号>/（历史版本，便于回滚）
+# 用法：python rec/algo/ucpr_incremental.py [--epochs 5] [--from-start]
+# =============================================================================
+
+import argparse
+import shutil
+import json
+import time
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.model_config import n_users, EMB, n_relations
+from rec.algo.ucpr_light import UCPRModel, BPRDataLoader, BASE_BATCH_SIZE, TRAIN_SEED
+
+CACHE_DIR = 'rec/algo/cache'
+FEEDBACK_LOG = 'data/experiment/feedback_log.jsonl'
+WATERMARK_PATH = os.path.join(CACHE_DIR, 'feedback_watermark.json')
+FINETUNE_EPOCHS = int(os.getenv("UCPR_FINETUNE_EPOCHS", "5"))
+FINETUNE_LR = float(os.getenv("UCPR_FINETUNE_LR", "1e-2"))  # 只更新少量行、轮数少，学习率高于全量训练
+POSITIVE_RATING = 4   # 评分 >= 4 视为正反馈
+NEGATIVE_RATING = 2   # 评分 <= 2 视为显式负反馈
+
+
+def load_watermark(path=WATERMARK_PATH):
+    """水位线：已处理到的反馈日志字节偏移"""
+    if not os.path.exists(path):
+        return {'offset': 0, 'timestamp': None}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_watermark(watermark, path=WATERMARK_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermark, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def reset_watermark(path=WATERMARK_PATH):
+    """全量重训后调用：新模型未见过任何反馈，下次增量训练从日志开头重放"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def read_new_feedback(offset, log_file=FEEDBACK_LOG):
+    """
+    从字节偏移 offset 起读取新增反馈，返回 (记录列表, 新偏移)
+    只消费以换行结尾的完整行（正在追加的半行留到下次）；日志被截断/轮转时从头读取
+    """
+    if not os.path.exists(log_file):
+        return [], 0
+    if os.path.getsize(log_file) < offset:
+        print("[INCR] 反馈日志小于水位线，视为已轮转，从头读取", flush=True)
+        offset = 0
+    with open(log_file, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    records = []
+    for line in data[:end].decode('utf-8').splitlines():
+        line = line.strip()
+        if line:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records, offset + end
+
+
+def feedback_pairs(records, n_nodes):
+    """
+    反馈 -> (正例 DataFrame, 显式负例 DataFrame)，列为 user/item（连续ID）
+    同一 (用户, 菜品) 以最后一次评分为准；用户/菜品ID越界的记录丢弃
+    """
+    latest = {}
+    for r in records:
+        try:
+            user, item, rating = int(r['user_id']), int(r['dish_id']), int(r['rating'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= user < n_users and n_users <= item < n_nodes:
+            latest[(user, item)] = rating
+    pos = [(u, i) for (u, i), rating in latest.items() if rating >= POSITIVE_RATING]
+    neg = [(u, i) for (u, i), rating in latest.items() if rating <= NEGATIVE_RATING]
+    return pd.DataFrame(pos, columns=['user', 'item']), pd.DataFrame(neg, columns=['user', 'item'])
+
+
+def build_triplets(samples, pos, neg, n_items, n_negatives=4, seed=TRAIN_SEED):
+    """
+    受影响用户的 (user, pos_item, neg_item)：
+    - 正例 = samples.csv 中已有正例 + 新的正反馈（保留旧偏好，避免只拟合新反馈），负例按全量训练的方式采样
+    - 显式负反馈菜品与该用户每个正例各组成一个三元组
+    """
+    users = np.union1d(pos['user'].to_numpy(), neg['user'].to_numpy())
+    old_pos = samples[(samples.label == 1) & samples.user.isin(users)][['user', 'item']]
+    all_pos = pd.concat([old_pos, pos]).drop_duplicates()
+    all_pos = all_pos.merge(neg, how='left', indicator=True)
+    all_pos = all_pos[all_pos['_merge'] == 'left_only'][['user', 'item']]  # 改判为负反馈的旧正例不再作为正例
+
+    parts = []
+    if len(all_pos):
+        parts.append(BPRDataLoader(all_pos.assign(label=1), n_items, n_negatives, seed=seed).sample_epoch())
+    if len(neg) and len(all_pos):
+        explicit = neg.merge(all_pos, on='user', suffixes=('_neg', '_pos'))
+        parts.append(tuple(torch.tensor(explicit[c].to_numpy(), dtype=torch.long)
+                           for c in ('user', 'item_pos', 'item_neg')))
+    if not parts:
+        return None
+    return tuple(torch.cat(cols) for cols in zip(*parts))
+
+
+def finetune_rows(model, rows, users, pos_items, neg_items, epochs=FINETUNE_EPOCHS, lr=FINETUNE_LR,
+                  batch_size=BASE_BATCH_SIZE, seed=TRAIN_SEED):
+    """
+    只训练 rows 对应的实体行：这些行拷贝为独立参数，其余实体与关系嵌入冻结；
+    损失与全量训练相同（BPR + L2），每步后归一化被训练的行，结束后写回 model.ent_emb
+    返回每轮平均损失
+    """
+    ent = model.ent_emb.weight.detach()
+    rel = model.rel_emb.weight.detach()
+    row_pos = torch.full((ent.shape[0],), -1, dtype=torch.long)
+    row_pos[rows] = torch.arange(len(rows))
+    rows_param = torch.nn.Parameter(ent[rows].clone())
+    optimizer = torch.optim.Adam([rows_param], lr=lr)
+
+    def lookup(idx):
+        local = row_pos[idx]
+        return torch.where((local >= 0)[:, None], rows_param[local.clamp(min=0)], ent[idx])
+
+    generator = torch.Generator().manual_seed(seed)
+    n = len(users)
+    losses = []
+    for _ in range(epochs):
+        perm = torch.randperm(n, generator=generator)
+        epoch_loss = torch.zeros(())
+        for start in range(0, n, batch_size):
+            idx = perm[start:start + batch_size]
+            u, pos, neg = lookup(users[idx]), lookup(pos_items[idx]), lookup(neg_items[idx])
+            q = u + rel[0]
+            loss = model.bpr_loss(-torch.norm(q - pos, dim=1), -torch.norm(q - neg, dim=1))
+            loss = loss + 0.001 * (torch.norm(u) + torch.norm(pos) + torch.norm(neg))
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            with torch.no_grad():
+                rows_param.copy_(F.normalize(rows_param, p=2, dim=1))
+            epoch_loss += loss.detach() * len(idx)
+        losses.append(epoch_loss.item() / n)
+
+    with torch.no_grad():
+        model.ent_emb.weight[rows] = rows_param
+    return losses
+
+
+def save_versioned(model, version, cache_dir=CACHE_DIR):
+    """
+    写出新版本：先归档到 checkpoints/<版本号>/，再原子替换在线的 .pth，最后导出嵌入包
+    嵌入包最后写出，是本次发布完成的标志：rec_api_stub 只监听嵌入包，以 version 作为 model_version
+    """
+    from rec.algo.emb_bundle import export_bundle
+    archive_dir = os.path.join(cache_dir, 'checkpoints', version)
+    os.makedirs(archive_dir, exist_ok=True)
+    for name, emb in (('ent_emb_bpr.pth', model.ent_emb), ('rel_emb_bpr.pth', model.rel_emb)):
+        archived = os.path.join(archive_dir, name)
+        torch.save(emb.state_dict(), archived)
+        tmp_path = os.path.join(cache_dir, f"{name}.tmp")
+        shutil.copyfile(archived, tmp_path)
+        os.replace(tmp_path, os.path.join(cache_dir, name))
+    export_bundle(ent=model.ent_emb.weight.detach().numpy(), rel=model.rel_emb.weight.detach().numpy(),
+                  version=version, cache_dir=cache_dir)
+
+
+def incremental_train(epochs=FINETUNE_EPOCHS, from_start=False, seed=TRAIN_SEED):
+    """增量训练入口；没有新反馈时返回 None，否则返回新模型版本号"""
+    start_time = time.perf_counter()
+    watermark = {'offset': 0, 'timestamp': None} if from_start else load_watermark()
+    records, new_offset = read_new_feedback(watermark['offset'])
+    if not records:
+        print(f"[INCR] 水位线 {watermark['offset']} 之后没有新反馈", flush=True)
+        if new_offset != watermark['offset']:
+            save_watermark({'offset': new_offset, 'timestamp': watermark['timestamp']})
+        return None
+
+    n_nodes = len(pd.read_pickle(os.path.join(CACHE_DIR, 'node_map.pkl')))
+    pos, neg = feedback_pairs(records, n_nodes)
+    samples = pd.read_csv(os.path.join(CACHE_DIR, 'samples.csv'))
+    triplets = build_triplets(samples, pos, neg, n_nodes - n_users, seed=seed)
+    watermark_next = {'offset': new_offset, 'timestamp': records[-1].get('timestamp')}
+    if triplets is None:
+        print(f"[INCR] {len(records)} 条新反馈中没有可用于训练的评分", flush=True)
+        save_watermark(watermark_next)
+        return None
+
+    model = UCPRModel(n_nodes, n_relations, EMB)
+    model.ent_emb.load_state_dict(torch.load(os.path.join(CACHE_DIR, 'ent_emb_bpr.pth'), map_location='cpu'))
+    model.rel_emb.load_state_dict(torch.load(os.path.join(CACHE_DIR, 'rel_emb_bpr.pth'), map_location='cpu'))
+
+    # 受影响的行：有新反馈的用户 + 新反馈涉及的菜品
+    rows = torch.from_numpy(np.unique(np.concatenate([
+        pos['user'].to_numpy(), pos['item'].to_numpy(), neg['user'].to_numpy(), neg['item'].to_numpy()
+    ]).astype(np.int64)))
+    users, pos_items, neg_items = triplets
+    print(f"[INCR] 新反馈 {len(records)} 条（正 {len(pos)} / 负 {len(neg)}），微调 {len(rows)} 行，"
+          f"{len(users)} 个三元组 × {epochs} 轮", flush=True)
+
+    losses = finetune_rows(model, rows, users, pos_items, neg_items, epochs=epochs, seed=seed)
+    print(f"[INCR] BPR Loss: {losses[0]:.4f} -> {losses[-1]:.4f}", flush=True)
+
+    version = time.strftime('%Y%m%d%H%M%S')
+    save_versioned(model, version)
+    save_watermark(watermark_next)
+    print(f"[INCR] 新模型版本 {version}，耗时 {time.perf_counter() - start_time:.2f}s", flush=True)
+    return version
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--epochs', type=int, default=FINETUNE_EPOCHS)
+    parser.add_argument('--from-start', action='store_true', help='忽略水位线，从反馈日志开头读取')
+    args = parser.parse_args()
+    incremental_train(epochs=args.epochs, from_start=args.from_start)
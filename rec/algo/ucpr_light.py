@@ -10,56 +10,100 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.multiprocessing as mp
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
-import random
+import queue
+import time
+import sys
 import os
 
-# 全局配置
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from rec.algo.model_config import n_users, EMB, n_relations
+
+# 全局配置（n_users / EMB / n_relations 统一定义在 model_config.py）
 EPOCH = 50
-EMB = 32
 device = 'cpu'
-n_users = 500  # 添加这行
 BPR_MARGIN = 0.5
+LR = 1e-3                # batch_size=64 时的学习率
+BASE_BATCH_SIZE = 64
+BATCH_SIZE = int(os.getenv("UCPR_BATCH_SIZE", str(BASE_BATCH_SIZE)))  # CPU 上调大（如 1024）吞吐更高
+TRAIN_WORKERS = int(os.getenv("UCPR_WORKERS", "1"))  # >1 时多进程 Hogwild 训练
+TRAIN_SEED = int(os.getenv("UCPR_SEED", "0"))
+WORKER_TIMEOUT = 600  # 秒，等待训练进程汇报一轮结果的上限
 
 
 class BPRDataLoader:
-    """BPR数据加载器：生成(user, pos_item, neg_item)三元组"""
+    """
+    BPR数据加载器：生成(user, pos_item, neg_item)三元组
+    正例按 CSR 存储：用户 u 的正例为 pos_items[indptr[u]:indptr[u + 1]]（升序去重）；
+    负例每轮一次性向量化采样，与正例冲突的位置按有序键数组判定后重采，直到全部合法
+    """
 
-    def __init__(self, samples_df, n_items, n_negatives=4):
+    def __init__(self, samples_df, n_items, n_negatives=4, seed=None):
         self.samples = samples_df
         self.n_items = n_items
         self.n_negatives = n_negatives
-        self.user_pos_items = self._build_user_pos_dict()
-
-    def _build_user_pos_dict(self):
-        """构建用户-正例物品映射"""
-        user_pos = {}
-        for _, row in self.samples[self.samples.label == 1].iterrows():
-            u = int(row['user'])
-            i = int(row['item'])
-            if u not in user_pos:
-                user_pos[u] = set()
-            user_pos[u].add(i)
-        return user_pos
+        self.rng = np.random.default_rng(seed)
+        self.indptr, self.pos_items = self._build_user_pos_csr()
+        # 每个正例 (user, item) 一行，按用户、物品升序
+        self.pos_users = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        # 冲突判定用的有序键 user * key_base + item
+        self.key_base = max(self.n_items, int(self.pos_items.max()) + 1 if len(self.pos_items) else 0)
+        self.pos_keys = self.pos_users * self.key_base + self.pos_items
+
+    def _build_user_pos_csr(self):
+        """构建用户-正例物品 CSR（indptr, pos_items）"""
+        pos = self.samples.loc[self.samples.label == 1, ['user', 'item']].to_numpy(dtype=np.int64)
+        pos = np.unique(pos, axis=0)  # 按 (user, item) 排序去重
+        n_rows = int(pos[:, 0].max()) + 1 if len(pos) else 0
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pos[:, 0], minlength=n_rows), out=indptr[1:])
+
+        # 负例从 [0, n_items) 中取，用户的正例占满该区间时无法采样
+        in_range = (pos[:, 1] >= 0) & (pos[:, 1] < self.n_items)
+        if len(pos) and np.bincount(pos[in_range, 0], minlength=n_rows).max(initial=0) >= self.n_items:
+            raise ValueError("存在正例覆盖全部物品的用户，无法负采样")
+        return indptr, pos[:, 1].copy()
+
+    @property
+    def user_pos_items(self):
+        """{用户: 正例物品集合}（兼容旧接口，训练不再使用）"""
+        return {u: set(self.pos_items[self.indptr[u]:self.indptr[u + 1]].tolist())
+                for u in np.flatnonzero(np.diff(self.indptr)).tolist()}
+
+    def _is_positive(self, users, items):
+        keys = users * self.key_base + items
+        if not len(self.pos_keys):
+            return np.zeros(len(keys), dtype=bool)
+        idx = np.searchsorted(self.pos_keys, keys)
+        idx[idx == len(self.pos_keys)] = 0
+        return self.pos_keys[idx] == keys
+
+    def sample_negatives(self, users):
+        """为每个用户各采一个不在其正例中的负例（向量化拒绝采样）"""
+        neg = self.rng.integers(0, self.n_items, size=len(users), dtype=np.int64)
+        redo = np.flatnonzero(self._is_positive(users, neg))
+        while len(redo):
+            neg[redo] = self.rng.integers(0, self.n_items, size=len(redo), dtype=np.int64)
+            redo = redo[self._is_positive(users[redo], neg[redo])]
+        return neg
+
+    def sample_epoch(self):
+        """
+        生成一轮BPR训练三元组，返回 (users, pos_items, neg_items) 三个 int64 张量
+        每个正例对应 n_negatives 行，排列顺序同 generate_triplets
+        """
+        users = np.repeat(self.pos_users, self.n_negatives)
+        pos_items = np.repeat(self.pos_items, self.n_negatives)
+        neg_items = self.sample_negatives(users)
+        return torch.from_numpy(users), torch.from_numpy(pos_items), torch.from_numpy(neg_items)
 
     def generate_triplets(self):
-        """生成BPR训练三元组"""
-        triplets = []
-        for user, pos_items in self.user_pos_items.items():
-            for pos_item in pos_items:
-                for _ in range(self.n_negatives):
-                    neg_item = self._sample_negative(user, pos_items)
-                    triplets.append((user, pos_item, neg_item))
-        return triplets
-
-    def _sample_negative(self, user, pos_items):
-        """负采样"""
-        while True:
-            neg = random.randint(0, self.n_items - 1)
-            if neg not in pos_items:
-                return neg
+        """生成BPR训练三元组（list of (user, pos_item, neg_item)）"""
+        users, pos_items, neg_items = self.sample_epoch()
+        return list(zip(users.tolist(), pos_items.tolist(), neg_items.tolist()))
 
 
 class UCPRModel(nn.Module):
@@ -98,63 +142,182 @@ class UCPRModel(nn.Module):
         return 0.001 * (torch.norm(u) + torch.norm(pos) + torch.norm(neg))
 
 
-def train_ucpr():
-    """训练UCPR模型"""
+def scaled_lr(batch_size):
+    """大批量时按 sqrt(batch_size / 64) 放大学习率，每轮步数变少但收敛到相同的 BPR 损失"""
+    return LR * (batch_size / BASE_BATCH_SIZE) ** 0.5
+
+
+def renormalize_rows(model, rows):
+    """只对本批涉及的实体行做 L2 归一化（原实现每步归一化整张实体表）；rows 可含重复下标"""
+    with torch.no_grad():
+        weight = model.ent_emb.weight
+        weight[rows] = F.normalize(weight[rows], p=2, dim=1)
+
+
+def train_epoch(model, optimizer, users, pos_items, neg_items, batch_size=BATCH_SIZE,
+                generator=None, renormalize_all=True):
+    """
+    一轮训练：三元组为预先生成的 int64 张量，按 randperm 下标切片取批，不再构造 Python 列表
+    Adam 的动量与 weight_decay 会轻微改动本批以外的行，轮末再整表归一化一次
+    返回与原实现口径相同的平均损失（总损失 / (样本数 / batch_size)）
+    Hogwild 子进程传 renormalize_all=False，整表归一化由主进程在各进程同步等待时完成
+    """
+    n = len(users)
+    perm = torch.randperm(n, generator=generator).to(users.device)
+    relations = torch.zeros(batch_size, dtype=torch.long, device=users.device)
+    epoch_loss = torch.zeros((), device=users.device)
+
+    for start in range(0, n, batch_size):
+        idx = perm[start:start + batch_size]
+        if len(idx) < 2:
+            continue
+        u, pos, neg = users[idx], pos_items[idx], neg_items[idx]
+
+        optimizer.zero_grad()
+
+        pos_score, neg_score = model(u, pos, neg, relations[:len(idx)])
+        loss = model.bpr_loss(pos_score, neg_score)
+        loss += model.l2_regularization(u, pos, neg)
+
+        loss.backward()
+        optimizer.step()
+
+        renormalize_rows(model, torch.cat([u, pos, neg]))
+        epoch_loss += loss.detach()
+
+    if renormalize_all:
+        renormalize_table(model)
+    return epoch_loss.item() / (n / batch_size)
+
+
+def renormalize_table(model):
+    with torch.no_grad():
+        model.ent_emb.weight.copy_(F.normalize(model.ent_emb.weight, p=2, dim=1))
+
+
+def _hogwild_worker(rank, workers, model, samples, n_items, batch_size, epochs, seed, results, barrier):
+    """
+    Hogwild 训练进程：各进程无锁更新共享内存中的同一份嵌入，各自持有 Adam 状态
+    所有进程用相同种子生成同一份三元组与打乱顺序，第 rank 个进程取 perm[rank::workers]，
+    每轮结束汇报损失并在 barrier 处等待主进程归一化/保存
+    """
+    torch.set_num_threads(1)  # 每个进程单线程，避免线程数超订
+    bpr_loader = BPRDataLoader(samples, n_items, n_negatives=4, seed=seed)
+    shard_gen = torch.Generator().manual_seed(seed)
+    batch_gen = torch.Generator().manual_seed(seed + 1 + rank)
+    optimizer = torch.optim.Adam(model.parameters(), lr=scaled_lr(batch_size), weight_decay=1e-5)
+    results.put(('ready', rank))
+    barrier.wait()  # 所有进程就绪后同时开始，便于主进程计时
+
+    for epoch in range(epochs):
+        users, pos_items, neg_items = bpr_loader.sample_epoch()
+        shard = torch.randperm(len(users), generator=shard_gen)[rank::workers]
+        avg_loss = train_epoch(model, optimizer, users[shard], pos_items[shard], neg_items[shard],
+                               batch_size, generator=batch_gen, renormalize_all=False)
+        results.put((epoch, avg_loss * len(shard) / batch_size, len(shard)))
+        barrier.wait()
+
+
+def train_hogwild(model, samples, n_items, workers, batch_size=BATCH_SIZE, epochs=EPOCH, seed=TRAIN_SEED,
+                  on_epoch=None):
+    """
+    多进程数据并行训练（Hogwild，torch.multiprocessing + 共享内存嵌入）
+    每轮汇总各进程损失后调用 on_epoch(epoch, avg_loss)（此时子进程均在等待，可安全保存模型）
+    返回每轮耗时（秒，不含进程启动）；workers > 1 时更新交错顺序不确定，损失有细微波动
+    """
+    model.share_memory()
+    ctx = mp.get_context('spawn')  # Windows 上只有 spawn，各平台行为一致
+    results = ctx.Queue()
+    barrier = ctx.Barrier(workers + 1)
+    procs = [ctx.Process(target=_hogwild_worker, name=f'ucpr-hogwild-{rank}',
+                         args=(rank, workers, model, samples, n_items, batch_size, epochs, seed, results, barrier))
+             for rank in range(workers)]
+    for p in procs:
+        p.start()
+
+    def collect():
+        deadline = time.time() + WORKER_TIMEOUT
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                dead = [p.name for p in procs if p.exitcode not in (None, 0)]
+                if dead or time.time() > deadline:
+                    raise RuntimeError(f"训练进程异常退出或超时: {dead or '等待超时'}")
+
+    epoch_times = []
+    try:
+        # 就绪消息经队列汇报，启动阶段异常退出的进程也能被及时发现
+        for _ in range(workers):
+            collect()
+        barrier.wait(timeout=WORKER_TIMEOUT)
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            reports = [collect() for _ in range(workers)]
+            epoch_times.append(time.perf_counter() - start)
+            renormalize_table(model)
+            total_loss, n = sum(r[1] for r in reports), sum(r[2] for r in reports)
+            if on_epoch is not None:
+                on_epoch(epoch, total_loss / (n / batch_size))
+            barrier.wait(timeout=WORKER_TIMEOUT)
+    except BaseException:
+        barrier.abort()
+        for p in procs:
+            p.terminate()
+        raise
+    finally:
+        for p in procs:
+            p.join()
+    return epoch_times
+
+
+def train_ucpr(batch_size=BATCH_SIZE, workers=TRAIN_WORKERS, seed=TRAIN_SEED):
+    """训练UCPR模型；workers > 1 时多进程 Hogwild 训练，同一 seed 下初始化、负采样与打乱顺序可复现"""
     kg = pd.read_csv('rec/algo/cache/kg_triplet.csv')
     samples = pd.read_csv('rec/algo/cache/samples.csv')
     n_nodes = len(pd.read_pickle('rec/algo/cache/node_map.pkl'))
     n_items = n_nodes - n_users
-    n_relations = len(kg['rel'].unique())
+    if kg['rel'].nunique() != n_relations:
+        raise ValueError(f"kg_triplet.csv 中有 {kg['rel'].nunique()} 种关系，与 model_config.n_relations={n_relations} 不一致")
 
-    print(f"节点数: {n_nodes}, 用户数: {n_users}, 物品数: {n_items}, 关系数: {n_relations}")
+    print(f"节点数: {n_nodes}, 用户数: {n_users}, 物品数: {n_items}, 关系数: {n_relations}, "
+          f"batch_size: {batch_size}, workers: {workers}, seed: {seed}")
 
+    torch.manual_seed(seed)
     model = UCPRModel(n_nodes, n_relations, EMB).to(device)
-    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-5)
-
-    bpr_loader = BPRDataLoader(samples, n_items, n_negatives=4)
 
     best_loss = float('inf')
-    for epoch in range(EPOCH):
-        triplets = bpr_loader.generate_triplets()
-        random.shuffle(triplets)
-
-        epoch_loss = 0.0
-        batch_size = 64
-
-        for i in range(0, len(triplets), batch_size):
-            batch = triplets[i:i + batch_size]
-            if len(batch) < 2:
-                continue
-
-            users = torch.LongTensor([t[0] for t in batch]).to(device)
-            pos_items = torch.LongTensor([t[1] for t in batch]).to(device)
-            neg_items = torch.LongTensor([t[2] for t in batch]).to(device)
-            relations = torch.LongTensor([0] * len(batch)).to(device)
-
-            optimizer.zero_grad()
 
-            pos_score, neg_score = model(users, pos_items, neg_items, relations)
-            loss = model.bpr_loss(pos_score, neg_score)
-            loss += model.l2_regularization(users, pos_items, neg_items)
-
-            loss.backward()
-            optimizer.step()
-
-            with torch.no_grad():
-                model.ent_emb.weight.data = F.normalize(model.ent_emb.weight.data, p=2, dim=1)
-
-            epoch_loss += loss.item()
-
-        avg_loss = epoch_loss / (len(triplets) / batch_size)
+    def save_if_best(epoch, avg_loss):
+        nonlocal best_loss
         print(f'Epoch {epoch:2d} | BPR Loss: {avg_loss:.4f}')
-
         if avg_loss < best_loss:
             best_loss = avg_loss
             torch.save(model.ent_emb.state_dict(), 'rec/algo/cache/ent_emb_bpr.pth')
             torch.save(model.rel_emb.state_dict(), 'rec/algo/cache/rel_emb_bpr.pth')
             print(f'  -> 保存最佳模型 (loss={best_loss:.4f})')
 
+    if workers > 1:
+        train_hogwild(model, samples, n_items, workers, batch_size, EPOCH, seed, on_epoch=save_if_best)
+    else:
+        optimizer = torch.optim.Adam(model.parameters(), lr=scaled_lr(batch_size), weight_decay=1e-5)
+        bpr_loader = BPRDataLoader(samples, n_items, n_negatives=4, seed=seed)
+        batch_gen = torch.Generator().manual_seed(seed + 1)
+        for epoch in range(EPOCH):
+            users, pos_items, neg_items = (t.to(device) for t in bpr_loader.sample_epoch())
+            save_if_best(epoch, train_epoch(model, optimizer, users, pos_items, neg_items, batch_size,
+                                            generator=batch_gen))
+
     print(f'\nUCPR-BPR训练完成，最佳损失: {best_loss:.4f}')
+
+    # 导出服务端使用的 mmap 嵌入包
+    from rec.algo.emb_bundle import export_bundle, BUNDLE_PATH
+    export_bundle()
+    print(f'嵌入包已导出: {BUNDLE_PATH}')
+
+    # 全量模型从头训练，反馈需由增量训练重新折叠进来
+    from rec.algo.ucpr_incremental import reset_watermark
+    reset_watermark()
     return model
 
 
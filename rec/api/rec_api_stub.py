@@ -1,41 +1,45 @@
 from flask_restx import Namespace, Resource, fields
-from py2neo import Graph
-from flask import current_app
-import torch
-import pandas as pd
+from flask import current_app, request
+import numpy as np
 import os
 import sys
 import json
 import hashlib
+import hmac
 import pickle
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from algo.ucpr_light import UCPRModel, n_users, device
-from algo.path_sampler import PathSampler
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# 服务端不依赖 torch：推理走纯 NumPy 的 TransEScorer（嵌入包 mmap 或直接解析 .pth），
+# 进程启动与加载模型都不付出 torch 的导入时间和内存
+from rec.algo.model_config import n_users
+from rec.algo.emb_bundle import load_bundle, BUNDLE_PATH
+from rec.algo.transe_infer import TransEScorer
+from rec.algo.ann_index import IVFIndex, ann_applicable, ANN_N_PROBE, ANN_RECALL_TARGET, ANN_TUNE_QUERIES
+from rec.algo.path_sampler import PathSampler
+from rec.algo.dish_catalog import get_catalog
+from rec.algo.kg_engine import get_kg_engine, PATH_SAMPLER_BACKEND
+from rec.algo.shared_attr_index import get_shared_attr_index
+from rec.algo.path_cache import get_path_cache
+from rec.api.rec_cache import RecCache, USER_VERSION_KEY
+from rec.api import rec_codec
 
 rec_bp = Namespace("rec", description="菜品推荐服务")
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_AUTH = (
-    os.getenv("NEO4J_USER", "neo4j"),
-    os.getenv("NEO4J_PASSWORD", "wwj@51816888")
-)
+# 反馈/新交互会通过用户版本号使缓存失效，TTL 只需兜底模型与菜品数据的更新
+CACHE_TTL = int(os.getenv("REC_CACHE_TTL", str(6 * 3600)))
+SHORT_CACHE_TTL = int(os.getenv("REC_SHORT_CACHE_TTL", "60"))  # 候选不足时的短 TTL，数据恢复后尽快重算
 
-CACHE_TTL = 15 * 60
-dish_id_to_name = {}
+_user_group_map = None  # A/B 测试分组配置，首次使用时加载
 
-# 加载 A/B 测试分组配置
-try:
-    with open('data/experiment/user_group_map.json', 'r', encoding='utf-8') as f:
-        user_group_map = json.load(f)
-    print(f"[REC] 加载 A/B 分组配置: {len(user_group_map)} 个用户", flush=True)
-except Exception as e:
-    print(f"[REC] 加载 A/B 分组配置失败: {e}", flush=True)
-    user_group_map = {}
+MAX_BATCH_USERS = 500
+SUPERSET_TOPK = 50  # 接口 topk 上限，每个用户缓存一份 Top-SUPERSET_TOPK，任意 topk 由切片得到
 
 rec_request = rec_bp.model('RecRequest', {
     'user_id': fields.Integer(required=True, description='用户ID'),
-    'topk': fields.Integer(default=10, min=1, max=50, description='推荐数量')
+    'topk': fields.Integer(default=10, min=1, max=SUPERSET_TOPK, description='推荐数量')
 })
 
 rec_item = rec_bp.model('RecItem', {
@@ -56,84 +60,211 @@ rec_response = rec_bp.model('RecResponse', {
     'from_cache': fields.Boolean(description='是否来自缓存'),
     'experiment_group': fields.String(description='A/B测试分组'),
     'show_explanation': fields.Boolean(description='是否显示解释'),
+    'model_version': fields.String(description='模型版本号'),
     'recommendations': fields.List(fields.Nested(rec_item))
 })
 
+batch_rec_request = rec_bp.model('BatchRecRequest', {
+    'user_ids': fields.List(fields.Integer, required=True, description='用户ID列表'),
+    'topk': fields.Integer(default=10, min=1, max=SUPERSET_TOPK, description='每个用户的推荐数量')
+})
+
+batch_rec_response = rec_bp.model('BatchRecResponse', {
+    'count': fields.Integer(description='返回的用户数'),
+    'cache_hits': fields.Integer(description='命中缓存的用户数'),
+    'results': fields.List(fields.Nested(rec_response))
+})
+
+model_status = rec_bp.model('ModelStatus', {
+    'model_version': fields.String(description='在线模型版本号'),
+    'status': fields.String(description='热更新状态：idle / loading / failed'),
+    'error': fields.String(description='最近一次热更新失败原因')
+})
+
+DEFAULT_EXPLANATION = "基于知识图谱推荐"
+
+# A组解释生成：batch = 一次批量采样；concurrent = 线程池并发采样（每请求限并发数并设截止时间）
+EXPLAIN_MODE = os.getenv("EXPLAIN_MODE", "batch")
+EXPLAIN_POOL_SIZE = int(os.getenv("EXPLAIN_POOL_SIZE", "16"))          # 进程级线程池大小
+EXPLAIN_CONCURRENCY = int(os.getenv("EXPLAIN_CONCURRENCY", "4"))       # 单个请求最多占用的并发任务数
+EXPLAIN_DEADLINE = float(os.getenv("EXPLAIN_DEADLINE_SECONDS", "1.5"))  # 单个请求解释生成的总时限
+_explain_executor = None
+_explain_executor_lock = threading.Lock()
+# 进程内已提交未结束的解释任务数上限 = 线程数：超时请求留下的任务仍在跑（future.cancel 停不掉运行中的任务），
+# 槽位占满时新请求直接用默认解释，不再排队等待这些任务
+_explain_slots = threading.BoundedSemaphore(EXPLAIN_POOL_SIZE)
+
+
+def get_user_group_map():
+    """加载 A/B 测试分组配置（首次调用时读取）"""
+    global _user_group_map
+    if _user_group_map is None:
+        try:
+            with open('data/experiment/user_group_map.json', 'r', encoding='utf-8') as f:
+                _user_group_map = json.load(f)
+            print(f"[REC] 加载 A/B 分组配置: {len(_user_group_map)} 个用户", flush=True)
+        except Exception as e:
+            print(f"[REC] 加载 A/B 分组配置失败: {e}", flush=True)
+            _user_group_map = {}
+    return _user_group_map
+
+
+def is_valid_user_id(user_id):
+    """合法用户ID：整数且在 [0, n_users) 内（JSON 的 true/false 在 Python 中是 int 子类，单独排除）"""
+    return isinstance(user_id, int) and not isinstance(user_id, bool) and 0 <= user_id < n_users
+
+
+def parse_topk(data):
+    """topk 须为 1..SUPERSET_TOPK 的整数：超集条目只有 SUPERSET_TOPK 个，负数切片也会返回错误数量"""
+    topk = data.get('topk', 10)
+    if not isinstance(topk, int) or isinstance(topk, bool) or not (1 <= topk <= SUPERSET_TOPK):
+        rec_bp.abort(400, f"topk 须为 1~{SUPERSET_TOPK} 的整数: {topk}")
+    return topk
+
 
 def get_user_group(user_id):
     """获取用户A/B测试分组，默认B组"""
-    return user_group_map.get(str(user_id), 'B')
+    return get_user_group_map().get(str(user_id), 'B')
 
 
-def load_dish_mapping():
-    global dish_id_to_name
-    try:
-        graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
-        query = "MATCH (d:Dish) RETURN id(d) as neo_id, d.name as name"
-        neo_result = graph.run(query).data()
-        neo_id_to_name = {r['neo_id']: r['name'] for r in neo_result if r['name']}
-        node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
-        for neo_id, cont_id in node_map.items():
-            if neo_id in neo_id_to_name:
-                dish_id_to_name[cont_id] = neo_id_to_name[neo_id]
-        current_app.logger.info(f"加载了 {len(dish_id_to_name)} 个 dish 映射")
-    except Exception as e:
-        current_app.logger.error(f"加载 dish 映射失败: {e}")
-
-
-def get_cache_key(user_id, topk):
-    key_str = f"rec:{user_id}:{topk}"
+def is_placeholder_name(name):
+    """占位菜品（如 菜品_123）不参与推荐"""
+    return '菜品_' in name or name.startswith('菜品')
+
+
+class DishMapping:
+    """
+    由模型所用的同一份 node_map 构建的菜品映射，作为 ModelState 的一部分随模型整体替换
+    （图谱重新导入后新模型的物品数可能变化，映射与掩码不能沿用旧 node_map 的结果）
+    """
+
+    def __init__(self, id_to_name, name_to_id, servable_mask):
+        self.id_to_name = id_to_name        # 连续ID -> 菜名
+        self.name_to_id = name_to_id        # 菜名 -> 连续ID
+        self.servable_mask = servable_mask  # (n_items,) bool，按物品偏移标记可推荐（非占位、有价格）的菜品
+
+
+def load_dish_mapping(node_map):
+    """查询 Neo4j 中的菜品，按 node_map 构建 DishMapping；失败时抛出异常"""
+    from app.extensions import neo4j_client
+    query = "MATCH (d:Dish) RETURN id(d) as neo_id, d.name as name, d.price as price"
+    neo_result = neo4j_client.run(query).data()
+    neo_id_to_dish = {r['neo_id']: r for r in neo_result if r['name']}
+
+    id_to_name = {}
+    name_to_id = {}
+    mask = np.zeros(max(len(node_map) - n_users, 0), dtype=bool)
+    for neo_id, cont_id in node_map.items():
+        record = neo_id_to_dish.get(neo_id)
+        if record is None:
+            continue
+        cont_id = int(cont_id)
+        name = record['name']
+        id_to_name[cont_id] = name
+        name_to_id.setdefault(name, cont_id)
+        if cont_id >= n_users and record['price'] and not is_placeholder_name(name):
+            mask[cont_id - n_users] = True
+    return DishMapping(id_to_name, name_to_id, mask)
+
+
+def ensure_dish_mapping(state):
+    """为模型状态加载菜品映射（首次或上次加载失败时），返回是否可用"""
+    if state.dishes is None:
+        try:
+            dishes = load_dish_mapping(state.node_map)
+        except Exception as e:
+            print(f"[REC] 加载 dish 映射失败: {e}", flush=True)
+            return False
+        state.dishes = dishes
+        print(f"[REC] 加载了 {len(dishes.id_to_name)} 个 dish 映射，可推荐 {int(dishes.servable_mask.sum())} 个 "
+              f"(model_version={state.version})", flush=True)
+    return True
+
+
+def get_cache_key(user_id, model_version):
+    """
+    每个用户只缓存一份 Top-SUPERSET_TOPK 排序结果，任意 topk 由切片得到
+    键中带模型版本号：热更新后新请求自然落到新键，旧条目随 TTL 过期
+    """
+    key_str = f"rec:{model_version}:{user_id}"
     return hashlib.md5(key_str.encode()).hexdigest()
 
 
-def get_from_cache(redis_client, cache_key):
-    if not redis_client:
-        return None
-    try:
-        cached = redis_client.get(cache_key)
-        if cached:
-            return json.loads(cached)
-    except Exception as e:
-        current_app.logger.warning(f"Redis 读取失败: {e}")
-    return None
+def get_version_key(user_id):
+    """用户版本号：feedback.py / init_users.py 写入新反馈或交互后自增"""
+    return USER_VERSION_KEY.format(user_id)
 
 
-def set_cache(redis_client, cache_key, data):
-    if not redis_client:
-        return False
-    try:
-        redis_client.setex(cache_key, CACHE_TTL, json.dumps(data))
-        return True
-    except Exception as e:
-        current_app.logger.warning(f"Redis 写入失败: {e}")
-    return False
+_rec_cache = None
+_rec_cache_lock = threading.Lock()
+
+
+def get_rec_cache():
+    """进程内共享的两级推荐缓存（本地 LRU + Redis，Redis 中为紧凑二进制格式）"""
+    global _rec_cache
+    if _rec_cache is None:
+        with _rec_cache_lock:
+            if _rec_cache is None:
+                from app.extensions import redis_binary_client
+                _rec_cache = RecCache(redis_binary_client, CACHE_TTL, dumps=rec_codec.dumps,
+                                      loads=lambda blob: rec_codec.loads(blob, rehydrate_items),
+                                      ttl_of=cache_ttl_for)
+                _rec_cache.start_invalidation_listener(
+                    lambda user_id: get_cache_key(user_id, _state.version if _state is not None else None)
+                )
+    return _rec_cache
+
+
+def cache_ttl_for(entry):
+    """
+    超集条目的缓存时长：空排序（菜品映射未加载、Neo4j 暂不可用等）不缓存；
+    不足 SUPERSET_TOPK 个的只短暂缓存，避免残缺结果被钉住整个 CACHE_TTL
+    """
+    n = len(entry['recommendations'])
+    if n == 0:
+        return 0
+    if n < SUPERSET_TOPK:
+        return min(SHORT_CACHE_TTL, CACHE_TTL)
+    return CACHE_TTL
+
+
+def make_item(cont_id, info, score, explanation=DEFAULT_EXPLANATION, path_data=None):
+    return {
+        'dish_id': cont_id or 0,
+        'dish_name': info['name'],
+        'price': info['price'],
+        'tags': info['tags'],
+        'ingredients': info['ingredients'],
+        'photo': info['photo'],
+        'score': score,
+        'explanation': explanation,
+        'paths': path_data or []
+    }
+
+
+def rehydrate_items(dish_ids):
+    """
+    二进制缓存条目还原：菜品ID -> 菜品目录中的静态属性；有菜品已下架时返回 None（按未命中重算）
+    使用当前请求所取模型状态中的映射（缓存键带模型版本号，条目与映射属于同一版本）
+    """
+    state = getattr(_serving, 'state', None) or _state
+    if state is None or not ensure_dish_mapping(state):
+        return None
+    names = [state.dishes.id_to_name.get(d) for d in dish_ids]
+    if None in names:
+        return None
+    dish_info = get_dish_info_by_names(names)
+    if any(name not in dish_info for name in names):
+        return None
+    return [make_item(d, dish_info[name], 0.0) for d, name in zip(dish_ids, names)]
 
 
 def get_dish_info_by_names(dish_names):
+    """从进程内菜品目录快照读取静态属性（不再逐请求查询 Neo4j）"""
     if not dish_names:
         return {}
-    graph = Graph(NEO4J_URI, auth=NEO4J_AUTH)
-    query = """
-    MATCH (d:Dish) WHERE d.name IN $dish_names
-    OPTIONAL MATCH (d)-[:HAS_TAG]->(t:Tag)
-    OPTIONAL MATCH (d)-[:CONTAINS]->(i:Ingredient)
-    RETURN d.name as name, d.price as price, d.file as photo,
-           collect(DISTINCT t.name) as tags,
-           collect(DISTINCT i.name) as ingredients
-    """
-    result = graph.run(query, dish_names=list(dish_names)).data()
-    info_map = {}
-    for record in result:
-        name = record['name']
-        if name:
-            info_map[name] = {
-                'name': name,
-                'price': record['price'] or 0,
-                'photo': record['photo'] or '',
-                'tags': [t for t in record['tags'] if t],
-                'ingredients': [i for i in record['ingredients'] if i]
-            }
-    return info_map
+    from app.extensions import redis_client, neo4j_client
+    return get_catalog(redis_client, neo4j_client).info_by_names(dish_names)
 
 
 def format_path_explanation(paths, target_name):
@@ -155,178 +286,652 @@ def format_path_explanation(paths, target_name):
     return "基于知识图谱路径推理推荐"
 
 
-# 全局模型缓存
-_model = None
-_model_loaded = False
+# 物化的全量用户 Top-N 排序表（加载模型时构建，请求只做切片）
+TOPK_TABLE_SIZE = SUPERSET_TOPK * 3  # 接口 topk 上限，候选取 3 倍
+CACHE_DIR = 'rec/algo/cache'
+MODEL_WATCH_INTERVAL = int(os.getenv("MODEL_WATCH_INTERVAL", "30"))  # 秒，检查是否有新发布的嵌入包，0 关闭
+ADMIN_TOKEN = os.getenv("REC_ADMIN_TOKEN", "")  # 模型管理接口口令，未配置时接口关闭
 
 
-def load_model():
-    """加载UCPR-BPR模型"""
-    global _model, _model_loaded
+class ModelState:
+    """
+    一次加载得到的全部推理状态（打分器、嵌入矩阵、Top-N 排序表、菜品映射、版本号）
+    由嵌入包加载时 item_emb 为文件映射的只读视图
+    热更新时整体替换模块级引用；请求开始时取一次引用，全程使用同一版本
+    """
+
+    def __init__(self, version, signature, scorer, node_map):
+        ent, rel = scorer.ent, scorer.rel
+        self.version = version
+        self.signature = signature  # ((文件路径, 修改时间ns), ...)，文件监听据此判断是否有新模型
+        self.scorer = scorer
+        self.node_map = node_map  # 校验模型形状所用的 {Neo4j节点ID: 连续ID}
+        self.dishes = None        # DishMapping，由 node_map 构建；Neo4j 不可用时为 None，请求时重试
+        self.item_emb = np.ascontiguousarray(ent[n_users:])             # (n_items, EMB)，行连续时不拷贝
+        self.item_sq_norm = np.einsum('ij,ij->i', self.item_emb, self.item_emb)
+        self.user_query = np.ascontiguousarray(ent[:n_users] + rel[0])  # (n_users, EMB) u + r[HAS_TAG]
+        self.topk_items = None   # (n_users, N) int32 物品偏移，按分数降序
+        self.topk_scores = None  # (n_users, N) float32 对应分数
+        self.ann = None          # ANN_INDEX=1 且物品数达到 ANN_MIN_ITEMS 时为 IVFIndex，Top-N 排序表由近似召回构建
+
+
+_state = None
+_state_lock = threading.Lock()     # 串行化加载/热更新
+_reload_thread = None
+_reload_thread_lock = threading.Lock()
+_reload_status = {'status': 'idle', 'error': None}
+_watcher = None
+_score_buf = threading.local()  # 每个线程复用的打分缓冲区
+_serving = threading.local()    # 当前线程正在服务的请求所用的模型状态（二进制缓存还原时取同版本映射）
+
+
+def model_paths():
+    """
+    在线模型文件：存在嵌入包时只用嵌入包（mmap 加载，见 rec/algo/emb_bundle.py），
+    否则优先BPR模型、回退到旧模型；返回 [嵌入包] 或 [实体嵌入, 关系嵌入或 None]
+    嵌入包是训练完成后原子替换写出的发布产物；.pth 在训练中每个更优的 epoch 都会重写，
+    比嵌入包新也不代表训练已完成，因此有嵌入包时不再看 .pth
+    """
+    if os.path.exists(BUNDLE_PATH):
+        return [BUNDLE_PATH]
+    ent_path = os.path.join(CACHE_DIR, 'ent_emb_bpr.pth')
+    if not os.path.exists(ent_path):
+        ent_path = os.path.join(CACHE_DIR, 'ent_emb.pth')
+    if not os.path.exists(ent_path):
+        raise FileNotFoundError("模型文件未找到")
+    rel_path = os.path.join(CACHE_DIR, 'rel_emb_bpr.pth')
+    if not os.path.exists(rel_path):
+        rel_path = os.path.join(CACHE_DIR, 'rel_emb.pth')
+    return [ent_path, (rel_path if os.path.exists(rel_path) else None)]
 
-    if _model_loaded:
-        return _model
 
-    cache_dir = os.path.join(os.path.dirname(__file__), '../algo/cache')
-    node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
-    n_nodes = len(node_map)
-    n_relations = 2  # HAS_TAG, CONTAINS
+def model_signature(paths):
+    return tuple((p, os.stat(p).st_mtime_ns) for p in paths if p)
 
-    _model = UCPRModel(n_nodes, n_relations, 32).to(device)
 
-    # 优先加载BPR模型，否则回退到旧模型
-    bpr_path = os.path.join(cache_dir, 'ent_emb_bpr.pth')
-    old_path = os.path.join(cache_dir, 'ent_emb.pth')
+def model_version_of(signature):
+    """模型版本号：实体嵌入文件的修改时间"""
+    return time.strftime('%Y%m%d%H%M%S', time.localtime(signature[0][1] / 1e9))
 
-    if os.path.exists(bpr_path):
-        _model.ent_emb.load_state_dict(torch.load(bpr_path, map_location=device))
-        print(f"[REC] 加载BPR模型: {bpr_path}", flush=True)
-    elif os.path.exists(old_path):
-        _model.ent_emb.load_state_dict(torch.load(old_path, map_location=device))
-        print(f"[REC] 加载旧模型: {old_path}", flush=True)
+
+def build_model_state():
+    """
+    从磁盘加载模型并校验形状，返回新的 ModelState（不影响当前在线状态）
+    菜品映射用校验模型时的同一份 node_map 构建，与嵌入一起替换
+    """
+    paths = model_paths()
+    signature = model_signature(paths)
+    with open(os.path.join(CACHE_DIR, 'node_map.pkl'), 'rb') as f:
+        node_map = pickle.load(f)
+    if paths[0] == BUNDLE_PATH:
+        # 嵌入矩阵直接映射文件页，各 worker 共享同一份物理内存；节点ID数组取包内的
+        bundle = load_bundle(BUNDLE_PATH)
+        if bundle.n_nodes != len(node_map):
+            raise ValueError(f"嵌入包节点数 {bundle.n_nodes} 与 node_map ({len(node_map)}) 不一致")
+        node_map = bundle.node_map()
+        scorer, version = TransEScorer.from_bundle(bundle), bundle.version
+        print(f"[REC] 映射嵌入包: {BUNDLE_PATH}", flush=True)
     else:
-        raise FileNotFoundError("模型文件未找到")
+        scorer = TransEScorer.from_checkpoint(paths[0], paths[1], len(node_map))
+        version = model_version_of(signature)
+        print(f"[REC] 加载模型: {paths[0]}", flush=True)
+
+    state = ModelState(version, signature, scorer, node_map)
+    ensure_dish_mapping(state)
+    if ann_applicable(state.item_emb.shape[0]):
+        state.ann = build_ann_index(state)
+    start = time.perf_counter()
+    state.topk_items, state.topk_scores = build_topk_table(state)
+    method = f"IVF n_probe={state.ann.n_probe}" if state.ann is not None else "精确扫描"
+    print(f"[REC] 构建 Top-{state.topk_items.shape[1]} 排序表: {state.topk_items.shape[0]} 个用户，{method}，"
+          f"耗时 {time.perf_counter() - start:.2f}s (model_version={state.version})", flush=True)
+    return state
+
+
+def build_ann_index(state, seed=0):
+    """
+    构建 IVF 索引，并在抽样用户上按 Top-TOPK_TABLE_SIZE 的召回率选取 n_probe
+    （ANN_N_PROBE 显式指定时只测量召回率，低于目标时告警）；n_probe 即排序表构建的召回率/耗时旋钮
+    """
+    index = IVFIndex(state.item_emb, seed=seed)
+    rng = np.random.default_rng(seed)
+    sample = state.user_query[rng.choice(n_users, min(ANN_TUNE_QUERIES, n_users), replace=False)]
+    if ANN_N_PROBE > 0:
+        index.recall = index.measure_recall(sample, TOPK_TABLE_SIZE)
+        if index.recall < ANN_RECALL_TARGET:
+            print(f"[REC] IVF 召回率 {index.recall:.4f} 低于目标 {ANN_RECALL_TARGET}，"
+                  f"可调大 ANN_N_PROBE 或设为 0 自动选取", flush=True)
+    else:
+        index.tune_n_probe(sample, TOPK_TABLE_SIZE, ANN_RECALL_TARGET)
+    print(f"[REC] 构建 IVF 索引: {index.n_lists} 个簇, n_probe={index.n_probe}, "
+          f"Top-{TOPK_TABLE_SIZE} 召回率 {index.recall:.4f}", flush=True)
+    return index
 
-    # 加载关系嵌入
-    rel_path = os.path.join(cache_dir, 'rel_emb_bpr.pth')
-    if not os.path.exists(rel_path):
-        rel_path = os.path.join(cache_dir, 'rel_emb.pth')
-    if os.path.exists(rel_path):
-        _model.rel_emb.load_state_dict(torch.load(rel_path, map_location=device))
 
-    _model.eval()
-    _model_loaded = True
-    return _model
+def load_model():
+    """首次调用时同步加载UCPR-BPR模型，并启动模型文件监听"""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = build_model_state()
+                start_model_watcher()
+    return _state
+
+
+def get_model_state():
+    return load_model()
+
+
+def reload_model():
+    """加载新模型并原子替换；失败时保留当前模型"""
+    global _state
+    with _state_lock:
+        _reload_status.update(status='loading', error=None)
+        try:
+            state = build_model_state()
+            if state.dishes is None:
+                raise RuntimeError("菜品映射加载失败")
+        except Exception as e:
+            _reload_status.update(status='failed', error=str(e))
+            print(f"[REC] 模型热更新失败，继续使用当前模型: {e}", flush=True)
+            return None
+        old_version = _state.version if _state is not None else None
+        _state = state
+        _reload_status.update(status='idle')
+    print(f"[REC] 模型热更新完成: {old_version} -> {state.version}", flush=True)
+    return state
+
+
+def start_model_reload():
+    """后台加载新模型；已有加载任务在进行时直接返回 False"""
+    global _reload_thread
+    with _reload_thread_lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+        _reload_status.update(status='loading', error=None)
+        _reload_thread = threading.Thread(target=reload_model, name='rec-model-reload', daemon=True)
+        _reload_thread.start()
+    return True
+
+
+def published_signature():
+    """已发布嵌入包的 (路径, 修改时间)；未发布时返回 None（训练中途的 .pth 不触发热更新）"""
+    try:
+        return model_signature([BUNDLE_PATH])
+    except OSError:
+        return None
+
+
+def _watch_model_files(interval):
+    rejected = None  # 校验失败的文件版本不反复重试，等待下一次发布
+    while True:
+        time.sleep(interval)
+        signature = published_signature()
+        if signature is None or signature in (_state.signature, rejected):
+            continue
+        if reload_model() is None:
+            rejected = signature
+
+
+def start_model_watcher(interval=MODEL_WATCH_INTERVAL):
+    """轮询嵌入包修改时间，train_ucpr / ucpr_incremental 发布新版本后在后台热更新"""
+    global _watcher
+    if _watcher is not None or interval <= 0:
+        return
+    _watcher = threading.Thread(target=_watch_model_files, args=(interval,), name='rec-model-watcher', daemon=True)
+    _watcher.start()
+
+
+def score_topk(user_id, k, state=None):
+    """
+    TransE 打分 -||u + r - item||，返回按分数降序的 (物品偏移, 分数)
+    有 IVF 索引时走近似召回（与排序表构建一致）
+    """
+    state = state or _state
+    if state.ann is not None:
+        return state.ann.search(state.user_query[user_id], k)
+    item_emb = state.item_emb
+    n_items = item_emb.shape[0]
+    k = min(k, n_items)
+    q = state.user_query[user_id]
+
+    buf = getattr(_score_buf, 'buf', None)
+    if buf is None or buf.shape[0] != n_items:
+        buf = _score_buf.buf = np.empty(n_items, dtype=np.float32)
+
+    # ||q - i||² = ||q||² - 2q·i + ||i||²，排序只需 2q·i - ||i||²（单次矩阵向量乘）
+    np.dot(item_emb, q, out=buf)
+    buf *= 2
+    buf -= state.item_sq_norm
+
+    top = np.argpartition(buf, n_items - k)[n_items - k:]
+    # 仅对候选集计算精确距离，保证返回的分数与原实现一致
+    scores = -np.linalg.norm(q - item_emb[top], axis=1)
+    order = np.argsort(-scores, kind='stable')
+    return top[order], scores[order]
+
+
+def score_topk_batch(user_ids, k, state=None):
+    """
+    批量精确打分：(users × items) 一次矩阵乘，返回每行降序的 (物品偏移, 分数)
+    """
+    state = state or _state
+    item_emb = state.item_emb
+    n_items = item_emb.shape[0]
+    k = min(k, n_items)
+    q = state.user_query[np.asarray(user_ids, dtype=np.int64)]
+
+    rank = q @ item_emb.T
+    rank *= 2
+    rank -= state.item_sq_norm
+
+    top = np.argpartition(rank, n_items - k, axis=1)[:, n_items - k:]
+    scores = -np.linalg.norm(q[:, None, :] - item_emb[top], axis=2)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def build_topk_table(state, n=TOPK_TABLE_SIZE, chunk_size=128, use_ann=True):
+    """
+    分块物化所有用户的 Top-N 物品与分数
+    有 IVF 索引时每个用户只扫描 n_probe 个簇（耗时不再随物品数线性增长，召回率见 state.ann.recall），
+    否则 (users × items) 精确批量打分
+    """
+    width = min(n, state.item_emb.shape[0])
+    items = np.empty((n_users, width), dtype=np.int32)
+    scores = np.empty((n_users, width), dtype=np.float32)
+    for start in range(0, n_users, chunk_size):
+        end = min(start + chunk_size, n_users)
+        if use_ann and state.ann is not None:
+            idx, val = state.ann.search_batch(state.user_query[start:end], width)
+        else:
+            idx, val = score_topk_batch(np.arange(start, end), width, state)
+        items[start:end] = idx
+        scores[start:end] = val
+    return items, scores
+
+
+def lookup_topk(user_id, k, state=None):
+    """从排序表切片取 Top-k，超出表宽时回退到实时打分"""
+    state = state or _state
+    if state.topk_items is not None and k <= state.topk_items.shape[1]:
+        return state.topk_items[user_id, :k], state.topk_scores[user_id, :k]
+    return score_topk(user_id, k, state)
+
+
+def lookup_topk_batch(user_ids, k, state=None):
+    """批量版 lookup_topk"""
+    state = state or _state
+    if state.topk_items is not None and k <= state.topk_items.shape[1]:
+        rows = np.asarray(user_ids, dtype=np.int64)
+        return state.topk_items[rows, :k], state.topk_scores[rows, :k]
+    return score_topk_batch(user_ids, k, state)
+
+
+def select_candidates(topk_indices, topk_values, topk, dishes):
+    """按可推荐掩码过滤占位菜品，返回候选菜名（保持分数顺序）和分数表"""
+    if dishes is None:
+        return [], {}
+    topk_indices = np.asarray(topk_indices)
+    keep = np.flatnonzero(dishes.servable_mask[topk_indices])[:topk * 2]
+
+    dish_names = []
+    score_map = {}
+    for idx, score in zip(topk_indices[keep], np.asarray(topk_values)[keep]):
+        name = dishes.id_to_name[int(idx) + n_users]
+        dish_names.append(name)
+        score_map[name] = float(score)
+    return dish_names, score_map
+
+
+def explain_paths(paths, name, path_sampler):
+    """路径 -> (解释文本, 前端展示的路径数据)"""
+    # 计算多样性指标
+    diversity = path_sampler.compute_path_diversity_v2(paths)
+    explanation = format_path_explanation(paths, name)
+    path_data = [
+        {
+            'relations': [p[0] for p in path],
+            'entities': [p[1] for p in path],
+            'pattern': path_sampler.get_path_pattern(path),
+            'diversity_score': diversity
+        } for path in paths[:3]
+    ]
+    return explanation, path_data
+
+
+def _explain_chunk(user_id, names, path_sampler, history):
+    paths_by_name = path_sampler.sample_paths_for_user_items(user_id, names, history=history)
+    return {name: explain_paths(paths_by_name.get(name, []), name, path_sampler) for name in names}
+
+
+def _explain_task(user_id, names, path_sampler, history, deadline):
+    """线程池任务：结束时归还槽位；开始执行时请求已超时则直接放弃"""
+    try:
+        if time.monotonic() >= deadline:
+            return {}
+        return _explain_chunk(user_id, names, path_sampler, history)
+    finally:
+        _explain_slots.release()
+
+
+def get_explain_executor():
+    global _explain_executor
+    if _explain_executor is None:
+        with _explain_executor_lock:
+            if _explain_executor is None:
+                _explain_executor = ThreadPoolExecutor(max_workers=EXPLAIN_POOL_SIZE,
+                                                       thread_name_prefix='rec-explain')
+    return _explain_executor
+
+
+def explain_items(user_id, names, path_sampler):
+    """
+    为入选菜品生成解释，返回 {菜名: (解释文本, 路径数据)}
+    concurrent 模式下按 EXPLAIN_CONCURRENCY 分块并发采样，超过 EXPLAIN_DEADLINE 未完成的菜品
+    使用默认解释；线程池槽位被先前超时的任务占满时，未能提交的分块同样使用默认解释；
+    调用方按原顺序组装，输出顺序稳定
+    """
+    if not names:
+        return {}
+    if EXPLAIN_MODE != 'concurrent' or len(names) == 1:
+        # 批量采样所有入选菜品的路径（常数次 Neo4j 往返）
+        return _explain_chunk(user_id, names, path_sampler, None)
+
+    deadline = time.monotonic() + EXPLAIN_DEADLINE
+    history = path_sampler.get_user_interacted_items(user_id)
+    n_chunks = min(EXPLAIN_CONCURRENCY, len(names))
+    chunks = [names[i::n_chunks] for i in range(n_chunks)]
+
+    executor = get_explain_executor()
+    futures = []
+    for chunk in chunks:
+        if not _explain_slots.acquire(blocking=False):
+            break
+        try:
+            futures.append(executor.submit(_explain_task, user_id, chunk, path_sampler, history, deadline))
+        except Exception:
+            _explain_slots.release()
+            raise
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+
+    explanations = {}
+    for future in futures:
+        if future in done and future.exception() is None:
+            explanations.update(future.result())
+    if not_done or len(explanations) < len(names):
+        current_app.logger.warning(f"解释生成超时或失败：{len(names) - len(explanations)}/{len(names)} 个菜品使用默认解释")
+    for name in names:
+        explanations.setdefault(name, explain_paths([], name, path_sampler))
+    return explanations
+
+
+def build_recommendations(user_id, topk, dish_names, score_map, dish_info, show_explanation, path_sampler, dishes):
+    """组装推荐列表；A组附带路径解释"""
+    selected = []
+    for name in dish_names:
+        if name not in dish_info:
+            continue
+        info = dish_info[name]
+        if not info['name'] or info['price'] == 0:
+            continue
+        selected.append(name)
+        if len(selected) >= topk:
+            break
+
+    # A/B测试：A组采样路径并生成解释，B组跳过
+    explanations = explain_items(user_id, selected, path_sampler) if show_explanation else {}
+
+    recommendations = []
+    for name in selected:
+        explanation, path_data = explanations.get(name, (DEFAULT_EXPLANATION, []))
+        recommendations.append(make_item(dishes.name_to_id.get(name), dish_info[name], score_map.get(name, 0.0),
+                                         explanation, path_data))
+    return recommendations
+
+
+def make_path_sampler():
+    """
+    共享连接池上的路径采样器
+    PATH_SAMPLER_BACKEND=memory 时路径枚举走内存图谱；存在共享属性索引时 2 跳路径直接查表；
+    菜品对路径结果经进程内共享的 LRU 缓存（可选 Redis）跨请求复用
+    """
+    from app.extensions import redis_client, neo4j_client
+    engine = None
+    if PATH_SAMPLER_BACKEND == 'memory':
+        engine = get_kg_engine(get_catalog(redis_client, neo4j_client))
+    return PathSampler(graph=neo4j_client, engine=engine, shared_index=get_shared_attr_index(redis_client),
+                       path_cache=get_path_cache(redis_client))
+
+
+def ensure_serving_ready():
+    """首次调用时加载模型与菜品映射，返回当前模型状态（请求内全程使用这一份）"""
+    try:
+        state = get_model_state()
+    except FileNotFoundError as e:
+        rec_bp.abort(500, str(e))
+
+    ensure_dish_mapping(state)
+    _serving.state = state
+    return state
+
+
+def compute_ranking(user_id, dish_names, score_map, dish_info, dishes):
+    """
+    用户的超集缓存条目：Top-SUPERSET_TOPK 推荐（不含解释）
+    explained 为已生成路径解释的前缀长度，A组请求按需补齐
+    """
+    recommendations = build_recommendations(
+        user_id, SUPERSET_TOPK, dish_names, score_map, dish_info, False, None, dishes
+    )
+    return {'user_id': user_id, 'explained': 0, 'recommendations': recommendations}
+
+
+def compute_user_ranking(user_id, state):
+    """单用户超集排序（缓存未命中或提前刷新时调用）"""
+    # BPR推理
+    topk_indices, topk_values = lookup_topk(user_id, SUPERSET_TOPK * 3, state)
+    dish_names, score_map = select_candidates(topk_indices, topk_values, SUPERSET_TOPK, state.dishes)
+    return compute_ranking(user_id, dish_names, score_map, get_dish_info_by_names(dish_names), state.dishes)
+
+
+def needs_explanation(entry, topk):
+    return entry['explained'] < min(topk, len(entry['recommendations']))
+
+
+def fill_explanations(entry, topk, path_sampler):
+    """为前 topk 个推荐补齐路径解释，返回新条目（不修改缓存中的原对象）"""
+    recommendations = list(entry['recommendations'])
+    end = min(topk, len(recommendations))
+    names = [item['dish_name'] for item in recommendations[entry['explained']:end]]
+    explanations = explain_items(entry['user_id'], names, path_sampler)
+    for i in range(entry['explained'], end):
+        explanation, path_data = explanations.get(recommendations[i]['dish_name'], (DEFAULT_EXPLANATION, []))
+        recommendations[i] = dict(recommendations[i], explanation=explanation, paths=path_data)
+    return dict(entry, explained=end, recommendations=recommendations)
+
+
+def slice_result(entry, topk, group, show_explanation, from_cache, model_version):
+    recommendations = entry['recommendations'][:topk]
+    if not show_explanation and entry['explained']:
+        recommendations = [dict(item, explanation=DEFAULT_EXPLANATION, paths=[]) for item in recommendations]
+    if len(recommendations) < topk:
+        current_app.logger.warning(f"推荐数量不足：请求 {topk}，实际返回 {len(recommendations)}")
+    return {
+        'user_id': entry['user_id'],
+        'topk': len(recommendations),
+        'from_cache': from_cache,
+        'experiment_group': group,
+        'show_explanation': show_explanation,
+        'model_version': model_version,
+        'recommendations': recommendations
+    }
+
+
+def recommend_batch(user_ids, topk, state):
+    """多用户推荐：一次 MGET 读缓存，未命中用户批量切片排序表，一次 pipeline 写回"""
+    # 与单用户接口共用每用户一份的超集缓存
+    rec_cache = get_rec_cache()
+    cache_keys = {u: get_cache_key(u, state.version) for u in user_ids}
+    cached = rec_cache.get_many([cache_keys[u] for u in user_ids],
+                                [get_version_key(u) for u in user_ids])
+    entries = {u: entry for u, (entry, _) in zip(user_ids, cached) if entry}
+    versions = {u: version for u, (_, version) in zip(user_ids, cached)}
+    hit_users = set(entries)
+    to_cache = {}
+
+    missing = [u for u in user_ids if u not in entries]
+    if missing:
+        # 所有未命中用户直接从排序表切片
+        batch_indices, batch_values = lookup_topk_batch(missing, SUPERSET_TOPK * 3, state)
+        candidates = [select_candidates(idx_row, val_row, SUPERSET_TOPK, state.dishes)
+                      for idx_row, val_row in zip(batch_indices, batch_values)]
+
+        # 所有候选菜品一次读取菜品目录
+        all_names = {name for dish_names, _ in candidates for name in dish_names}
+        dish_info = get_dish_info_by_names(all_names)
+
+        for user_id, (dish_names, score_map) in zip(missing, candidates):
+            entries[user_id] = to_cache[user_id] = compute_ranking(user_id, dish_names, score_map, dish_info,
+                                                                  state.dishes)
+
+    path_sampler = None
+    results = []
+    for user_id in user_ids:
+        group = get_user_group(user_id)
+        show_explanation = (group == 'A')
+        entry = entries[user_id]
+        if show_explanation and needs_explanation(entry, topk):
+            if path_sampler is None:
+                path_sampler = make_path_sampler()
+            entry = to_cache[user_id] = fill_explanations(entry, topk, path_sampler)
+        results.append(slice_result(entry, topk, group, show_explanation, user_id in hit_users, state.version))
+
+    # 新算的排序带上读取时的版本号写入；已缓存条目补齐解释后原样写回
+    fresh = [u for u in to_cache if u not in hit_users]
+    rec_cache.set_many([(cache_keys[u], to_cache[u]) for u in fresh], versions=[versions[u] for u in fresh])
+    rec_cache.update_many([(cache_keys[u], entry) for u, entry in to_cache.items() if u in hit_users])
+
+    return {
+        'count': len(user_ids),
+        'cache_hits': len(hit_users),
+        'results': results
+    }
+
+
+def warm_up(prefill_user_ids=(), prefill_topk=10):
+    """
+    预加载模型、菜品映射/目录、路径索引与缓存实例，并建立 Neo4j/Redis 首次连接
+    prefill_user_ids 非空时按批量接口的逻辑为这些用户预填推荐缓存
+    模型加载失败直接抛出；其余步骤失败只记录日志（请求时仍会按需重试）
+    """
+    from app.extensions import redis_client, neo4j_client
+    start = time.time()
+    state = get_model_state()
+    ensure_dish_mapping(state)
+    _serving.state = state
+
+    steps = [
+        ('菜品目录', lambda: get_catalog(redis_client, neo4j_client)),
+        ('共享属性索引', lambda: get_shared_attr_index(redis_client)),
+        ('推荐缓存', get_rec_cache),
+        ('路径缓存', lambda: get_path_cache(redis_client)),
+        ('Redis 连接', redis_client.ping),
+        ('Neo4j 连接', lambda: neo4j_client.run("RETURN 1").data()),
+    ]
+    if PATH_SAMPLER_BACKEND == 'memory':
+        steps.append(('内存图谱', lambda: get_kg_engine(get_catalog(redis_client, neo4j_client))))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            current_app.logger.warning(f"预热 {name} 失败: {e}")
+
+    user_ids = [u for u in dict.fromkeys(int(u) for u in prefill_user_ids) if 0 <= u < n_users]
+    for i in range(0, len(user_ids), MAX_BATCH_USERS):
+        try:
+            recommend_batch(user_ids[i:i + MAX_BATCH_USERS], prefill_topk, state)
+        except Exception as e:
+            current_app.logger.warning(f"预填推荐缓存失败: {e}")
+            break
+    current_app.logger.info(f"推荐服务预热完成：模型 {state.version}，预填 {len(user_ids)} 个用户，"
+                            f"耗时 {time.time() - start:.1f}s")
 
 
 @rec_bp.route("/")
 class Recommend(Resource):
-    @rec_bp.expect(rec_request)
+    @rec_bp.expect(rec_request, validate=True)
     @rec_bp.marshal_with(rec_response)
     def post(self):
         data = rec_bp.payload
         user_id = data.get('user_id')
-        topk = data.get('topk', 10)
+        topk = parse_topk(data)
 
-        if user_id is None or not (0 <= user_id < n_users):
+        if not is_valid_user_id(user_id):
             rec_bp.abort(400, f"无效user_id: {user_id}")
 
         # 获取A/B测试分组
         group = get_user_group(user_id)
         show_explanation = (group == 'A')
 
-        from app.extensions import redis_client
-        cache_key = get_cache_key(user_id, topk)
-        cached_result = get_from_cache(redis_client, cache_key)
+        # 加载模型与菜品映射（首次调用）
+        state = ensure_serving_ready()
 
-        if cached_result:
-            cached_result['from_cache'] = True
-            cached_result['experiment_group'] = group
-            cached_result['show_explanation'] = show_explanation
-            return cached_result
+        # 本地 LRU -> Redis -> 重算；同一 key 并发未命中时只有一个请求执行重算
+        rec_cache = get_rec_cache()
+        cache_key = get_cache_key(user_id, state.version)
+        entry, from_cache = rec_cache.get_or_compute(
+            cache_key, lambda: compute_user_ranking(user_id, state), version_key=get_version_key(user_id)
+        )
 
-        # 加载模型（首次调用）
-        try:
-            model = load_model()
-        except FileNotFoundError as e:
-            rec_bp.abort(500, str(e))
-
-        global dish_id_to_name
-        if not dish_id_to_name:
-            load_dish_mapping()
-
-        path_sampler = PathSampler()
-
-        # BPR推理
-        n_items = model.ent_emb.weight.shape[0] - n_users
-        with torch.no_grad():
-            user_tensor = torch.LongTensor([user_id] * n_items).to(device)
-            items_tensor = torch.LongTensor(list(range(n_users, n_users + n_items))).to(device)
-            rel_tensor = torch.LongTensor([0] * n_items).to(device)
-
-            u = model.ent_emb(user_tensor)
-            r = model.rel_emb(rel_tensor)
-            item_emb = model.ent_emb(items_tensor)
-
-            all_scores = -torch.norm(u + r - item_emb, dim=1)
-
-            actual_topk = min(topk * 3, n_items)
-            topk_values, topk_indices = torch.topk(all_scores, actual_topk)
-
-        dish_names = []
-        score_map = {}
-        for idx, score in zip(topk_indices.cpu().numpy(), topk_values.numpy()):
-            cont_id = int(idx) + n_users
-            name = dish_id_to_name.get(cont_id)
-            if not name or '菜品_' in name or name.startswith('菜品'):
-                continue
-            dish_names.append(name)
-            score_map[name] = float(score)
-            if len(dish_names) >= topk * 2:
-                break
-
-        dish_info = get_dish_info_by_names(dish_names)
-
-        recommendations = []
-        for name in dish_names:
-            if name not in dish_info:
-                continue
-            info = dish_info[name]
-            if not info['name'] or info['price'] == 0:
-                continue
-
-            cont_id = None
-            for cid, cname in dish_id_to_name.items():
-                if cname == name:
-                    cont_id = cid
-                    break
-
-            # A/B测试：A组采样路径并显示解释，B组跳过
-            if show_explanation:
-                paths = path_sampler.sample_paths_for_user_item(user_id, name)
-                # 计算多样性指标
-                diversity = path_sampler.compute_path_diversity_v2(paths)
-                explanation = format_path_explanation(paths, name)
-                path_data = [
-                    {
-                        'relations': [p[0] for p in path],
-                        'entities': [p[1] for p in path],
-                        'pattern': path_sampler.get_path_pattern(path),
-                        'diversity_score': diversity
-                    } for path in paths[:3]
-                ]
-            else:
-                paths = []
-                explanation = "基于知识图谱推荐"
-                path_data = []
-
-            recommendations.append({
-                'dish_id': cont_id or 0,
-                'dish_name': info['name'],
-                'price': info['price'],
-                'tags': info['tags'],
-                'ingredients': info['ingredients'],
-                'photo': info['photo'],
-                'score': score_map.get(name, 0.0),
-                'explanation': explanation,
-                'paths': path_data
-            })
-
-            if len(recommendations) >= topk:
-                break
-
-        result = {
-            'user_id': user_id,
-            'topk': len(recommendations),
-            'from_cache': False,
-            'experiment_group': group,
-            'show_explanation': show_explanation,
-            'recommendations': recommendations
-        }
-
-        set_cache(redis_client, cache_key, result)
-
-        if len(recommendations) < topk:
-            current_app.logger.warning(f"推荐数量不足：请求 {topk}，实际返回 {len(recommendations)}")
-
-        return result
\ No newline at end of file
+        # A/B测试：A组按需补齐前 topk 个菜品的路径解释并写回，B组跳过
+        if show_explanation and needs_explanation(entry, topk):
+            entry = fill_explanations(entry, topk, make_path_sampler())
+            rec_cache.update(cache_key, entry)
+
+        return slice_result(entry, topk, group, show_explanation, from_cache, state.version)
+
+
+@rec_bp.route("/batch")
+class BatchRecommend(Resource):
+    @rec_bp.expect(batch_rec_request, validate=True)
+    @rec_bp.marshal_with(batch_rec_response)
+    def post(self):
+        data = rec_bp.payload
+        user_ids = data.get('user_ids') or []
+        topk = parse_topk(data)
+
+        if not isinstance(user_ids, list):
+            rec_bp.abort(400, "user_ids 必须是用户ID列表")
+        if len(user_ids) > MAX_BATCH_USERS:
+            rec_bp.abort(400, f"单次最多 {MAX_BATCH_USERS} 个用户")
+        invalid = [u for u in user_ids if not is_valid_user_id(u)]
+        if invalid:
+            rec_bp.abort(400, f"无效user_id: {invalid}")
+
+        # 去重但保持请求顺序
+        user_ids = list(dict.fromkeys(user_ids))
+
+        state = ensure_serving_ready()
+        return recommend_batch(user_ids, topk, state)
+
+
+@rec_bp.route("/model")
+class ModelAdmin(Resource):
+    @rec_bp.marshal_with(model_status)
+    def get(self):
+        """在线模型版本与热更新状态"""
+        return dict(_reload_status, model_version=_state.version if _state is not None else None)
+
+    @rec_bp.marshal_with(model_status, code=202)
+    def post(self):
+        """后台加载最新发布的嵌入包，校验通过后原子替换（需 X-Admin-Token）"""
+        if not ADMIN_TOKEN:
+            rec_bp.abort(403, "未配置 REC_ADMIN_TOKEN，模型管理接口已关闭")
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            rec_bp.abort(403, "口令错误")
+        if published_signature() is None:
+            rec_bp.abort(409, f"未找到已发布的嵌入包 {BUNDLE_PATH}（训练结束或 python rec/algo/emb_bundle.py 导出后再热更新）")
+        start_model_reload()
+        return dict(_reload_status, model_version=_state.version if _state is not None else None), 202
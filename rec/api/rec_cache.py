@@ -0,0 +1,322 @@
+# =============================================================================
+# 功能：推荐结果两级缓存（进程内 LRU + Redis），带击穿保护与过期前概率刷新
+# 优化：本地命中免去 Redis 往返与 JSON 解码；同一 key 同时只有一个请求重算
+#       （进程内锁 + Redis SET NX 锁）；按 XFetch 在过期前随机提前刷新，避免整点集中过期
+# 失效：条目记录写入时的用户版本号 rec:ver:{user_id}，读取时与版本号同一次 MGET 比对；
+#       反馈/新交互写入后 bump_user_version 自增版本号，并经 pub/sub 通知各 worker 清理本地副本
+# 归属：服务层性能优化（缓存）
+# 上游：app/extensions.py（redis_client）
+# 下游：rec/api/rec_api_stub.py（Recommend / BatchRecommend）
+# =============================================================================
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+import threading
+import secrets
+import random
+import math
+import json
+import time
+import os
+
+LOCAL_CACHE_SIZE = int(os.getenv("REC_LOCAL_CACHE_SIZE", "2048"))
+LOCAL_CACHE_TTL = float(os.getenv("REC_LOCAL_CACHE_TTL", "30"))     # 本地副本最长存活秒数（限制跨 worker 的陈旧度）
+EARLY_REFRESH_BETA = float(os.getenv("REC_EARLY_REFRESH_BETA", "1.0"))  # XFetch 系数，越大越早刷新，0 关闭
+RECOMPUTE_LOCK_TTL = 10     # Redis 重算锁的过期秒数（持锁进程崩溃时自动释放）
+RECOMPUTE_WAIT = 3.0        # 未抢到锁且无旧值时，等待其他 worker 写入结果的最长秒数
+USER_VERSION_KEY = 'rec:ver:{}'
+INVALIDATE_CHANNEL = 'rec:invalidate'
+# 比较令牌后删除：只释放自己持有的锁（锁已过期并被其他 worker 重新持有时不误删）
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def bump_user_version(redis_client, user_id):
+    """用户有新反馈/新交互时调用：使其推荐缓存失效，并通知各 worker 清理本地副本"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(USER_VERSION_KEY.format(user_id))
+    pipe.publish(INVALIDATE_CHANNEL, str(user_id))
+    pipe.execute()
+
+
+def _to_str(value):
+    """兼容 decode_responses=False 的二进制客户端"""
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class RecCache:
+    """
+    缓存条目（envelope）：{'value': 推荐结果, 'delta': 重算耗时秒, 'expire_at': 过期时间戳,
+                           'version': 计算前读到的版本号}
+    本地与 Redis 存相同 envelope，本地层保存已解码的对象；
+    传入 version_key 时，Redis 中版本号与条目不一致的视为未命中
+    Redis 中的编码由 dumps / loads 决定（默认 JSON；loads 返回 None 视为未命中）
+    ttl_of(value) 可按结果内容给出 TTL 秒数（<= 0 表示不缓存），未传入时一律用 ttl
+    """
+
+    def __init__(self, redis_client, ttl, local_size=LOCAL_CACHE_SIZE, local_ttl=LOCAL_CACHE_TTL,
+                 beta=EARLY_REFRESH_BETA, dumps=json.dumps, loads=json.loads, ttl_of=None):
+        self.redis_client = redis_client
+        self.dumps = dumps
+        self.loads = loads
+        self.ttl = ttl
+        self.ttl_of = ttl_of
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.beta = beta
+        self._local = OrderedDict()  # key -> (local_expire_at, envelope)
+        self._local_lock = threading.Lock()
+        self._key_locks = {}         # key -> [Lock, 引用计数]
+        self._key_locks_guard = threading.Lock()
+        self._listener = None
+
+    # --- 本地 LRU ---
+    def _local_get(self, key):
+        now = time.time()
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            local_expire_at, envelope = entry
+            if local_expire_at < now or envelope['expire_at'] < now:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return envelope
+
+    def _local_set(self, key, envelope):
+        local_expire_at = min(time.time() + self.local_ttl, envelope['expire_at'])
+        with self._local_lock:
+            self._local[key] = (local_expire_at, envelope)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def evict_local(self, key):
+        with self._local_lock:
+            self._local.pop(key, None)
+
+    # --- Redis ---
+    def _redis_get_many(self, keys, version_keys=None):
+        """返回 (envelopes, versions)；条目与版本号在同一次 MGET 中读取"""
+        version_keys = version_keys or [None] * len(keys)
+        versions = [None] * len(keys)
+        if not self.redis_client or not keys:
+            return [None] * len(keys), versions
+        extra = [(i, vk) for i, vk in enumerate(version_keys) if vk]
+        try:
+            values = self.redis_client.mget(list(keys) + [vk for _, vk in extra])
+        except Exception as e:
+            current_app.logger.warning(f"Redis 读取失败: {e}")
+            return [None] * len(keys), versions
+        for (i, _), version in zip(extra, values[len(keys):]):
+            versions[i] = _to_str(version) or '0'
+        envelopes = []
+        for i, value in enumerate(values[:len(keys)]):
+            envelope = self._decode(value) if value else None
+            if envelope is not None and version_keys[i] and envelope.get('version') != versions[i]:
+                envelope = None
+            envelopes.append(envelope)
+        return envelopes, versions
+
+    def _decode(self, value):
+        try:
+            return self.loads(value)
+        except Exception as e:
+            current_app.logger.warning(f"缓存条目解码失败: {e}")
+        return None
+
+    def _redis_set_many(self, items):
+        if not self.redis_client or not items:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            now = time.time()
+            for key, envelope in items:
+                ttl = int(envelope['expire_at'] - now) + 1
+                if ttl > 0:
+                    pipe.setex(key, ttl, self.dumps(envelope))
+            pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Redis 写入失败: {e}")
+
+    def _try_redis_lock(self, key):
+        """抢到锁返回随机令牌，未抢到返回 None；Redis 不可用时返回令牌（退化为仅进程内单飞）"""
+        token = secrets.token_hex(8)
+        if not self.redis_client:
+            return token
+        try:
+            acquired = self.redis_client.set(f"lock:{key}", token, nx=True, ex=RECOMPUTE_LOCK_TTL)
+        except Exception:
+            return token
+        return token if acquired else None
+
+    def _release_redis_lock(self, key, token):
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception:
+            pass
+
+    # --- 单飞 ---
+    @contextmanager
+    def _single_flight(self, key):
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def _should_refresh(self, envelope):
+        """XFetch：now - delta * beta * ln(rand) >= expire_at 时提前重算"""
+        if self.beta <= 0:
+            return False
+        gap = -envelope.get('delta', 0.0) * self.beta * math.log(max(random.random(), 1e-12))
+        return time.time() + gap >= envelope['expire_at']
+
+    def _envelope(self, value, delta, version=None):
+        """ttl_of 判定不缓存时返回 None"""
+        ttl = self.ttl_of(value) if self.ttl_of is not None else self.ttl
+        if ttl <= 0:
+            return None
+        return {'value': value, 'delta': delta, 'expire_at': time.time() + ttl, 'version': version}
+
+    def _lookup(self, key, version_key=None):
+        """返回 (envelope, version)；本地命中时版本号取条目自身记录的值"""
+        envelope = self._local_get(key)
+        if envelope is not None:
+            return envelope, envelope.get('version')
+        envelopes, versions = self._redis_get_many([key], [version_key])
+        if envelopes[0] is not None:
+            self._local_set(key, envelopes[0])
+        return envelopes[0], versions[0]
+
+    # --- 对外接口 ---
+    def get_or_compute(self, key, compute, version_key=None):
+        """
+        返回 (value, from_cache)
+        未命中时同一 key 只有一个请求执行 compute，其余请求等待其结果；
+        临近过期时由随机选中的单个请求提前重算，其余请求继续使用旧值
+        """
+        envelope, _ = self._lookup(key, version_key)
+        if envelope is not None and not self._should_refresh(envelope):
+            return dict(envelope['value']), True
+
+        stale = envelope
+        with self._single_flight(key):
+            # 等锁期间可能已被同进程其他线程算好
+            envelope, version = self._lookup(key, version_key)
+            if envelope is not None and envelope is not stale:
+                return dict(envelope['value']), True
+
+            # 未抢到锁且等待超时时本 worker 也会重算，但只有持锁者才释放锁
+            token = self._try_redis_lock(key)
+            if token is None:
+                if stale is not None:
+                    return dict(stale['value']), True
+                envelope = self._wait_for_other_worker(key, version_key)
+                if envelope is not None:
+                    return dict(envelope['value']), True
+
+            try:
+                # 版本号取计算前读到的值：计算期间若再次自增，写入的条目即刻失效
+                start = time.time()
+                value = compute()
+                self.set(key, value, delta=time.time() - start, version=version)
+            finally:
+                if token is not None:
+                    self._release_redis_lock(key, token)
+        return dict(value), False
+
+    def _wait_for_other_worker(self, key, version_key=None):
+        deadline = time.time() + RECOMPUTE_WAIT
+        while time.time() < deadline:
+            time.sleep(0.05)
+            envelope = self._redis_get_many([key], [version_key])[0][0]
+            if envelope is not None:
+                self._local_set(key, envelope)
+                return envelope
+        return None
+
+    def get_many(self, keys, version_keys=None):
+        """
+        批量读取（本地层 + 一次 MGET），返回 [(value 或 None, version)]
+        未命中项的 version 供调用方重算后传给 set_many
+        """
+        envelopes = [self._local_get(key) for key in keys]
+        versions = [env.get('version') if env is not None else None for env in envelopes]
+        missing = [i for i, env in enumerate(envelopes) if env is None]
+        if missing:
+            found, found_versions = self._redis_get_many(
+                [keys[i] for i in missing], [version_keys[i] for i in missing] if version_keys else None
+            )
+            for i, env, version in zip(missing, found, found_versions):
+                versions[i] = version
+                if env is not None:
+                    self._local_set(keys[i], env)
+                    envelopes[i] = env
+        return [(dict(env['value']) if env is not None else None, version)
+                for env, version in zip(envelopes, versions)]
+
+    def set(self, key, value, delta=0.0, version=None):
+        self.set_many([(key, value)], delta=delta, versions=[version])
+
+    def set_many(self, items, delta=0.0, versions=None):
+        versions = versions or [None] * len(items)
+        envelopes = [(key, self._envelope(value, delta, version))
+                     for (key, value), version in zip(items, versions)]
+        envelopes = [(key, envelope) for key, envelope in envelopes if envelope is not None]
+        for key, envelope in envelopes:
+            self._local_set(key, envelope)
+        self._redis_set_many(envelopes)
+
+    def update_many(self, items):
+        """
+        改写已缓存条目的内容，保留其版本号与过期时间（如补齐解释后写回）
+        本地副本已失效（过期或被失效通知清理）的条目不写回，避免旧结果以新面目复活
+        """
+        envelopes = []
+        for key, value in items:
+            envelope = self._local_get(key)
+            if envelope is not None:
+                envelopes.append((key, dict(envelope, value=value)))
+        for key, envelope in envelopes:
+            self._local_set(key, envelope)
+        self._redis_set_many(envelopes)
+
+    def update(self, key, value):
+        self.update_many([(key, value)])
+
+    # --- 失效通知 ---
+    def start_invalidation_listener(self, key_of, channel=INVALIDATE_CHANNEL):
+        """订阅失效频道，消息为 user_id，key_of(user_id) 得到需清理的本地缓存键"""
+        if self.redis_client is None or self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, args=(key_of, channel),
+                                          name='rec-cache-invalidation', daemon=True)
+        self._listener.start()
+
+    def _listen(self, key_of, channel):
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self.evict_local(key_of(_to_str(message['data'])))
+            except Exception as e:
+                # 断线期间本地副本最多存活 local_ttl 秒，Redis 层仍由版本号兜底
+                print(f"[REC] 缓存失效订阅中断，稍后重连: {e}", flush=True)
+                time.sleep(5)
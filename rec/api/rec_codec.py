@@ -0,0 +1,103 @@
+# =============================================================================
+# 功能：推荐缓存条目的紧凑二进制编码（替代 JSON）
+# 优化：菜品只存连续ID与 float32 分数，名称/价格/照片/标签/食材读取时由内存菜品目录还原；
+#       解释与路径仅对已生成的前缀存储，关系名编码为整数；正文可选 zlib 压缩
+# 归属：服务层性能优化（缓存）
+# 上游：rec/api/rec_cache.py（envelope 序列化钩子 dumps / loads）
+# 下游：rec/api/rec_api_stub.py（get_rec_cache 中绑定还原函数）
+# =============================================================================
+#
+# 布局（小端）：
+#   头部  B 格式版本 | B 标志位 | d delta | d expire_at | H 版本号长度 | 版本号(utf-8)
+#   正文  i user_id | H explained | H 菜品数 n | i32[n] 菜品ID | f32[n] 分数 | 解释段(JSON, utf-8)
+#   标志位 bit0 = 正文经 zlib 压缩
+# 解释段为前 explained 个菜品的 [解释文本, 多样性分数, [[关系码...], [实体...], 模式], ...]]
+
+import struct
+import zlib
+import json
+import os
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+COMPRESS = os.getenv("REC_CACHE_COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = 512  # 正文小于该值时压缩收益不抵开销
+
+HEADER = struct.Struct('<BBddH')
+BODY_HEADER = struct.Struct('<iHH')
+RELATION_CODES = {'HAS_TAG': 0, 'CONTAINS': 1}
+RELATION_NAMES = {code: rel for rel, code in RELATION_CODES.items()}
+
+
+def _encode_paths(paths):
+    return [[[RELATION_CODES.get(r, r) for r in p['relations']], p['entities'], p['pattern']] for p in paths]
+
+
+def _decode_paths(paths, diversity):
+    return [{
+        'relations': [RELATION_NAMES.get(r, r) for r in relations],
+        'entities': entities,
+        'pattern': pattern,
+        'diversity_score': diversity
+    } for relations, entities, pattern in paths]
+
+
+def dumps(envelope):
+    entry = envelope['value']
+    items = entry['recommendations']
+    explained = entry['explained']
+
+    explain_section = [[item['explanation'],
+                        item['paths'][0]['diversity_score'] if item['paths'] else 0.0,
+                        _encode_paths(item['paths'])] for item in items[:explained]]
+    body = b''.join([
+        BODY_HEADER.pack(entry['user_id'], explained, len(items)),
+        struct.pack(f'<{len(items)}i', *[item['dish_id'] for item in items]),
+        struct.pack(f'<{len(items)}f', *[item['score'] for item in items]),
+        json.dumps(explain_section, ensure_ascii=False, separators=(',', ':')).encode('utf-8') if explained else b''
+    ])
+
+    flags = 0
+    if COMPRESS and len(body) >= COMPRESS_MIN_BYTES:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+
+    version = (envelope.get('version') or '').encode('utf-8')
+    header = HEADER.pack(FORMAT_VERSION, flags, envelope['delta'], envelope['expire_at'], len(version))
+    return header + version + body
+
+
+def loads(blob, rehydrate):
+    """
+    rehydrate(dish_ids) -> 与 dish_ids 等长的基础菜品字典列表（dish_id/dish_name/price/tags/ingredients/photo），
+    有菜品已不在目录中时返回 None；格式版本不符或无法还原时返回 None，由调用方按未命中处理
+    """
+    if not blob or blob[0] != FORMAT_VERSION:
+        return None
+    _, flags, delta, expire_at, version_len = HEADER.unpack_from(blob)
+    offset = HEADER.size
+    version = blob[offset:offset + version_len].decode('utf-8') or None
+    body = blob[offset + version_len:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    user_id, explained, n = BODY_HEADER.unpack_from(body)
+    offset = BODY_HEADER.size
+    dish_ids = struct.unpack_from(f'<{n}i', body, offset)
+    offset += 4 * n
+    scores = struct.unpack_from(f'<{n}f', body, offset)
+    offset += 4 * n
+    explain_section = json.loads(body[offset:].decode('utf-8')) if explained else []
+
+    items = rehydrate(dish_ids)
+    if items is None:
+        return None
+    for i, (item, score) in enumerate(zip(items, scores)):
+        item['score'] = score
+        if i < explained:
+            explanation, diversity, paths = explain_section[i]
+            item['explanation'] = explanation
+            item['paths'] = _decode_paths(paths, diversity)
+
+    entry = {'user_id': user_id, 'explained': explained, 'recommendations': items}
+    return {'value': entry, 'delta': delta, 'expire_at': expire_at, 'version': version}
@@ -14,11 +14,10 @@ import os
 from sklearn.metrics import ndcg_score
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from algo.ucpr_light import UCPRModel, device
+from algo.ucpr_light import UCPRModel, device, n_users, EMB, n_relations
 
 # 配置
 TOPK = 10
-n_users = 500
 
 # 加载节点映射
 node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
@@ -26,7 +25,7 @@ n_nodes = len(node_map)
 n_items = n_nodes - n_users
 
 # 初始化 BPR 模型
-model = UCPRModel(n_nodes, 2, 32).to(device)
+model = UCPRModel(n_nodes, n_relations, EMB).to(device)
 
 # 加载 BPR 训练好的权重（优先加载BPR模型）
 cache_dir = 'rec/algo/cache'
@@ -0,0 +1,92 @@
+# =============================================================================
+# 功能：IVF 近似召回 vs 全量精确扫描 的召回率/延迟对比
+# 归属：服务层性能优化（候选召回）
+# 上游：rec/algo/cache/ent_emb_bpr.pth、rel_emb_bpr.pth（或 emb_bundle.bin）
+# 用法：python scripts/bench_ann.py [--scale 20] [--k 150] [--users 200] [--target 0.95]
+#       --scale 将物品按比例复制并加噪声，模拟接入更多校区后的菜品规模
+#       最后一行为服务端按召回率目标自动选取的 n_probe（ANN_N_PROBE=0 时的行为）
+# =============================================================================
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rec.algo.model_config import n_users
+from rec.algo.emb_bundle import load_bundle
+from rec.algo.ann_index import IVFIndex, ANN_RECALL_TARGET
+from rec.algo.transe_infer import load_state_dict
+
+
+def load_embeddings():
+    bundle = load_bundle()
+    if bundle is not None:
+        return np.asarray(bundle.ent), np.asarray(bundle.rel)
+    ent = load_state_dict('rec/algo/cache/ent_emb_bpr.pth')['weight']
+    rel = load_state_dict('rec/algo/cache/rel_emb_bpr.pth')['weight']
+    return ent, rel
+
+
+def exact_topk(items, items_sq, q, k):
+    rank = items @ q
+    rank *= 2
+    rank -= items_sq
+    top = np.argpartition(rank, len(items) - k)[len(items) - k:]
+    scores = -np.linalg.norm(q - items[top], axis=1)
+    order = np.argsort(-scores, kind='stable')
+    return top[order]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1, help='物品规模放大倍数')
+    parser.add_argument('--k', type=int, default=150, help='召回数量（服务端排序表宽度为 150）')
+    parser.add_argument('--users', type=int, default=200, help='参与测试的用户数')
+    parser.add_argument('--probes', type=str, default='1,2,4,8,16,32')
+    parser.add_argument('--target', type=float, default=ANN_RECALL_TARGET, help='自动选取 n_probe 的召回率目标')
+    args = parser.parse_args()
+
+    ent, rel = load_embeddings()
+    items = ent[n_users:].astype(np.float32)
+    if args.scale > 1:
+        rng = np.random.default_rng(0)
+        noise = rng.normal(scale=0.05, size=(len(items) * (args.scale - 1), items.shape[1])).astype(np.float32)
+        items = np.vstack([items, np.tile(items, (args.scale - 1, 1)) + noise])
+    items = np.ascontiguousarray(items)
+    items_sq = np.einsum('ij,ij->i', items, items)
+    queries = (ent[:n_users] + rel[0]).astype(np.float32)[:args.users]
+    k = min(args.k, len(items))
+
+    t0 = time.perf_counter()
+    index = IVFIndex(items)
+    build_s = time.perf_counter() - t0
+    print(f"物品数 {len(items)}，查询 {len(queries)} 个用户，Top-{k}")
+    print(f"IVF 构建 {build_s:.2f}s，{index.n_lists} 个簇")
+
+    t0 = time.perf_counter()
+    truth = [exact_topk(items, items_sq, q, k) for q in queries]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    print(f"{'方法':<14}{'召回率':>10}{'单次耗时(ms)':>16}{'加速比':>10}")
+    print(f"{'精确扫描':<14}{1.0:>10.4f}{exact_ms:>16.3f}{1.0:>10.2f}")
+
+    for n_probe in [int(p) for p in args.probes.split(',') if int(p) <= index.n_lists]:
+        t0 = time.perf_counter()
+        results = [index.search(q, k, n_probe)[0] for q in queries]
+        ann_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        recall = np.mean([len(np.intersect1d(r, t)) / k for r, t in zip(results, truth)])
+        print(f"{f'IVF n_probe={n_probe}':<14}{recall:>10.4f}{ann_ms:>16.3f}{exact_ms / ann_ms:>10.2f}")
+
+    n_probe, recall = index.tune_n_probe(queries, k, args.target)
+    t0 = time.perf_counter()
+    for q in queries:
+        index.search(q, k)
+    ann_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    print(f"召回率目标 {args.target}：自动选取 n_probe={n_probe}，召回率 {recall:.4f}，"
+          f"单次 {ann_ms:.3f}ms（精确扫描 {exact_ms:.3f}ms）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# =============================================================================
+# 功能：UCPR-BPR 多进程 Hogwild 训练的扩展性测试（吞吐 samples/sec vs 进程数）
+# 归属：训练层性能优化（并行训练）
+# 上游：rec/algo/cache/samples.csv、node_map.pkl（sample_maker.py / neo2dgl.py）
+# 用法：python scripts/bench_train_parallel.py [--workers 1,2,4,8] [--epochs 5] [--batch-size 1024]
+#       只计时训练轮次（不含进程启动），不写出模型文件
+# =============================================================================
+
+import argparse
+import time
+import sys
+import os
+
+import pandas as pd
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rec.algo.model_config import n_users, EMB, n_relations
+from rec.algo.ucpr_light import (UCPRModel, BPRDataLoader, train_epoch, train_hogwild, scaled_lr,
+                                 TRAIN_SEED)
+
+
+def run_single(samples, n_nodes, epochs, batch_size, seed):
+    """单进程基线（与 train_ucpr 的 workers=1 路径相同）"""
+    torch.manual_seed(seed)
+    model = UCPRModel(n_nodes, n_relations, EMB)
+    optimizer = torch.optim.Adam(model.parameters(), lr=scaled_lr(batch_size), weight_decay=1e-5)
+    bpr_loader = BPRDataLoader(samples, n_nodes - n_users, n_negatives=4, seed=seed)
+    batch_gen = torch.Generator().manual_seed(seed + 1)
+    epoch_times, losses = [], []
+    for _ in range(epochs):
+        users, pos_items, neg_items = bpr_loader.sample_epoch()
+        start = time.perf_counter()
+        losses.append(train_epoch(model, optimizer, users, pos_items, neg_items, batch_size, generator=batch_gen))
+        epoch_times.append(time.perf_counter() - start)
+    return epoch_times, losses
+
+
+def run_hogwild(samples, n_nodes, workers, epochs, batch_size, seed):
+    torch.manual_seed(seed)
+    model = UCPRModel(n_nodes, n_relations, EMB)
+    losses = []
+    epoch_times = train_hogwild(model, samples, n_nodes - n_users, workers, batch_size, epochs, seed,
+                                on_epoch=lambda epoch, loss: losses.append(loss))
+    return epoch_times, losses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=str, default='1,2,4,8')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=TRAIN_SEED)
+    args = parser.parse_args()
+
+    samples = pd.read_csv('rec/algo/cache/samples.csv')
+    n_nodes = len(pd.read_pickle('rec/algo/cache/node_map.pkl'))
+    n_samples = BPRDataLoader(samples, n_nodes - n_users).pos_users.size * 4
+    print(f"CPU 核数 {os.cpu_count()}，每轮 {n_samples} 个三元组，batch_size={args.batch_size}，{args.epochs} 轮")
+    print(f"{'进程数':<8}{'samples/sec':>14}{'加速比':>10}{'末轮损失':>12}")
+
+    base = None
+    for workers in [int(w) for w in args.workers.split(',')]:
+        if workers == 1:
+            epoch_times, losses = run_single(samples, n_nodes, args.epochs, args.batch_size, args.seed)
+        else:
+            epoch_times, losses = run_hogwild(samples, n_nodes, workers, args.epochs, args.batch_size, args.seed)
+        throughput = n_samples * len(epoch_times) / sum(epoch_times)
+        base = base or throughput
+        print(f"{workers:<8}{throughput:>14.0f}{throughput / base:>10.2f}{losses[-1]:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
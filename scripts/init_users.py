@@ -4,9 +4,15 @@
 # 下游：Neo4j 中的 User 节点和 INTERACTED 关系
 # =============================================================================
 
+from redis import Redis
 import requests
 import random
 import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rec.api.rec_cache import bump_user_version
 
 BASE_URL = "http://localhost:5000"
 API_URL = f"{BASE_URL}/api/v1"
@@ -70,9 +76,19 @@ def create_interactions(user_id, token, num_interactions=15):
         except Exception as e:
             print(f"  创建交互失败 {dish_name}: {e}")
 
+    invalidate_rec_cache(user_id)
     return len(selected_dishes)
 
 
+def invalidate_rec_cache(user_id):
+    """新交互写入后自增用户版本号，API 端该用户的推荐缓存随即失效（见 rec/api/rec_cache.py）"""
+    try:
+        redis_client = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True)
+        bump_user_version(redis_client, user_id)
+    except Exception as e:
+        print(f"  推荐缓存失效通知失败: {e}")
+
+
 def main():
     print(f"开始创建 {NUM_USERS} 个测试用户...")
 
@@ -9,7 +9,11 @@
 
 
 from py2neo import Graph, Node, Relationship
-import json, sys
+from redis import Redis
+import json, sys, os, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rec.algo.dish_catalog import KG_VERSION_KEY
 # Graph: Neo4j 数据库连接对象
 # Node: 图谱节点（实体）
 # Relationship: 图谱关系（边）
@@ -32,4 +36,13 @@ for m in menu:   # 遍历每道菜品
         graph.merge(ing, "Ingredient", "name")   # 幂等创建食材节点，相同食材复用
         graph.create(Relationship(dish, "CONTAINS", ing))
 
-print("✅ KG 构建完成，共导入", len(menu), "道菜品")
\ No newline at end of file
+print("✅ KG 构建完成，共导入", len(menu), "道菜品")
+
+# 写入图谱版本号，API 进程中的菜品目录快照据此在后台刷新（见 rec/algo/dish_catalog.py），
+# 路径缓存检测到版本变化后整体作废（见 rec/algo/path_cache.py）
+try:
+    redis_client = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True)
+    redis_client.set(KG_VERSION_KEY, str(int(time.time())))
+    print(f"✅ 已更新图谱版本号 {KG_VERSION_KEY}")
+except Exception as e:
+    print(f"⚠️ 更新图谱版本号失败（API 需重启才能看到新菜品数据）: {e}")
\ No newline at end of file
@@ -4,9 +4,14 @@ UCPR优化效果测试脚本
 1. 路径多样性（2跳 vs 3跳）
 2. BPR模型评分分布
 3. 推荐结果多样性对比
+4. 应用启动耗时（create_app 导入预算）
+5. NumPy 推理与 UCPRModel 打分一致性
+6. IVF 近似召回构建的 Top-N 排序表与精确排序表的召回率
 """
 
 import sys
+import os
+import subprocess
 import torch
 import pickle
 import random
@@ -15,7 +20,9 @@ from collections import defaultdict
 
 sys.path.append('rec/algo')
 from path_sampler import PathSampler
-from ucpr_light import UCPRModel, device
+from ucpr_light import UCPRModel, device, n_users, EMB, n_relations
+from transe_infer import TransEScorer
+from emb_bundle import load_bundle
 
 
 def test_path_diversity():
@@ -83,9 +90,8 @@ def test_bpr_model():
     # 加载模型
     node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
     n_nodes = len(node_map)
-    n_users = 500
 
-    model = UCPRModel(n_nodes, 2, 32).to(device)
+    model = UCPRModel(n_nodes, n_relations, EMB).to(device)
 
     # 尝试加载BPR模型
     try:
@@ -161,9 +167,6 @@ def test_recommendation_diversity():
     node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
     sampler = PathSampler()
 
-    # 加载模型（简化版，仅测试结构）
-    n_users = 500
-
     test_user = 0
     print(f"\n测试用户: {test_user}")
 
@@ -197,6 +200,106 @@ def test_recommendation_diversity():
     return True
 
 
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+
+
+def test_import_budget():
+    """测试 create_app() 启动耗时，并确认未提前导入 torch/pandas"""
+    print("\n" + "=" * 60)
+    print("测试4：应用启动耗时")
+    print("=" * 60)
+
+    # 新解释器中测量，避免本脚本已导入的 torch 干扰
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        "print(time.perf_counter() - start)\n"
+        "print(','.join(m for m in ('torch', 'pandas') if m in sys.modules))\n"
+    )
+    timings = []
+    heavy = ''
+    for _ in range(3):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split('\n')
+        timings.append(float(out[0]))
+        heavy = heavy or out[1]
+    elapsed = min(timings)
+
+    print(f"  create_app 耗时: {elapsed:.3f}s（预算 {IMPORT_BUDGET_SECONDS:.1f}s）")
+    print(f"  启动时已导入的重依赖: {heavy or '无'}")
+    return elapsed <= IMPORT_BUDGET_SECONDS and not heavy
+
+
+def test_numpy_scorer():
+    """测试纯 NumPy 打分器与 UCPRModel 的 TransE 打分一致"""
+    print("\n" + "=" * 60)
+    print("测试5：NumPy 推理一致性")
+    print("=" * 60)
+
+    ent_path, rel_path = 'rec/algo/cache/ent_emb_bpr.pth', 'rec/algo/cache/rel_emb_bpr.pth'
+    n_nodes = len(pickle.load(open('rec/algo/cache/node_map.pkl', 'rb')))
+    model = UCPRModel(n_nodes, n_relations, EMB).to(device)
+    model.ent_emb.load_state_dict(torch.load(ent_path, map_location=device))
+    model.rel_emb.load_state_dict(torch.load(rel_path, map_location=device))
+    model.eval()
+
+    scorers = {'.pth': TransEScorer.from_checkpoint(ent_path, rel_path, n_nodes)}
+    bundle = load_bundle()
+    if bundle is not None and bundle.n_nodes == n_nodes:
+        scorers['嵌入包'] = TransEScorer.from_bundle(bundle)
+
+    test_users = [0, 10, 20, 30, 40]
+    n_items = n_nodes - n_users
+    items = np.arange(n_users, n_nodes)
+    max_diff = {name: 0.0 for name in scorers}
+    with torch.no_grad():
+        for user_id in test_users:
+            users_tensor = torch.LongTensor([user_id] * n_items).to(device)
+            items_tensor = torch.LongTensor(items).to(device)
+            rel_tensor = torch.LongTensor([0] * n_items).to(device)
+            expected, _ = model(users_tensor, items_tensor, items_tensor, rel_tensor)
+            expected = expected.cpu().numpy()
+            for name, scorer in scorers.items():
+                diff = max(np.abs(scorer.score_items(user_id) - expected).max(),
+                           np.abs(scorer.score([user_id] * n_items, items) - expected).max())
+                max_diff[name] = max(max_diff[name], float(diff))
+
+    for name, diff in max_diff.items():
+        print(f"  {name}: 最大绝对误差 {diff:.2e}")
+    return all(diff < 1e-5 for diff in max_diff.values())
+
+
+ANN_RECALL_TOLERANCE = 0.02  # 全量用户召回率相对抽样估计的允许偏差
+
+
+def test_ann_topk_table():
+    """测试 IVF 构建的排序表：与精确排序表的重合率不低于 build_ann_index 报告的召回率，分数为精确距离"""
+    print("\n" + "=" * 60)
+    print("测试6：IVF 排序表召回率")
+    print("=" * 60)
+    from rec.api.rec_api_stub import ModelState, build_ann_index, build_topk_table
+
+    ent_path, rel_path = 'rec/algo/cache/ent_emb_bpr.pth', 'rec/algo/cache/rel_emb_bpr.pth'
+    node_map = pickle.load(open('rec/algo/cache/node_map.pkl', 'rb'))
+    scorer = TransEScorer.from_checkpoint(ent_path, rel_path, len(node_map))
+    state = ModelState('test', (), scorer, node_map)
+    state.ann = build_ann_index(state)
+
+    exact_items, _ = build_topk_table(state, use_ann=False)
+    ann_items, ann_scores = build_topk_table(state)
+    k = exact_items.shape[1]
+    recall = np.mean([len(np.intersect1d(a, e)) / k for a, e in zip(ann_items, exact_items)])
+    users = np.repeat(np.arange(n_users), k)
+    expected = scorer.score(users, ann_items.ravel().astype(np.int64) + n_users).reshape(ann_scores.shape)
+    score_diff = float(np.abs(ann_scores - expected).max())
+    ordered = bool((np.diff(ann_scores, axis=1) <= 1e-6).all())
+
+    print(f"  报告召回率 {state.ann.recall:.4f}（n_probe={state.ann.n_probe}），全量用户实测 {recall:.4f}")
+    print(f"  分数最大绝对误差 {score_diff:.2e}，按分数降序: {ordered}")
+    return recall >= state.ann.recall - ANN_RECALL_TOLERANCE and score_diff < 1e-4 and ordered
+
+
 def generate_report():
     """生成优化报告"""
     print("\n" + "=" * 60)
@@ -206,7 +309,10 @@ def generate_report():
     results = {
         '路径多样性': test_path_diversity(),
         'BPR模型效果': test_bpr_model(),
-        '推荐多样性': test_recommendation_diversity()
+        '推荐多样性': test_recommendation_diversity(),
+        '启动耗时': test_import_budget(),
+        'NumPy推理一致性': test_numpy_scorer(),
+        'IVF排序表召回率': test_ann_topk_table()
     }
 
     print("\n" + "=" * 60)